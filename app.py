@@ -1,9 +1,26 @@
+import json
+import os
 import streamlit as st
-from PIL import Image
-import keras
-from src.utils.model_utils import predict
+from src.data_preprocessing.image_io import load_image, ImageTooLargeError, DEFAULT_MAX_PIXELS
+from src.serving.client import predict_remote
+from src.serving.config import model_path, available_variants, IMAGE_SIZE
+from src.serving.model_pool import ModelPool
+from src.serving.prediction_cache import PredictionCache, model_version
+from src.serving.ensemble import EnsemblePredictor, COMBINE_MODES, calibration_path, load_calibration, member_versions
+from src.serving.cascade import CascadePredictor, CASCADE_STAGES, load_thresholds, thresholds_path
+from src.utils import instrumentation
 import pandas as pd
 
+INFERENCE_SERVER_URL = os.environ.get('INFERENCE_SERVER_URL')
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get('MODEL_MEMORY_BUDGET_MB', 2048))
+DEFAULT_MODEL = 'vgg16'
+ENSEMBLE_MODELS = ['vgg16', 'resnet50v2', 'mobilenetv2']
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 256))
+PREDICTION_CACHE_PATH = os.environ.get('PREDICTION_CACHE_PATH')
+MAX_UPLOAD_PIXELS = int(os.environ.get('MAX_UPLOAD_PIXELS', DEFAULT_MAX_PIXELS))
+PREVIEW_SIZE = (512, 512)
+PROFILE_LOG_DIR = os.environ.get('PROFILE_LOG_DIR', './logs/profile')
+
 class_details = {
     "Glioma": 
         "Glioma adalah tumor yang terbentuk ketika sel glia tubuh Anda tumbuh tak terkendali. Sel glia menopang saraf dan membantu sistem saraf pusat bekerja. Jika tumbuh tak terkendali, sel-sel ini dapat membentuk tumor di otak atau sumsum tulang belakang. Glioma adalah tumor primer. Artinya, tumor ini terbentuk langsung di otak atau sumsum tulang belakang.",
@@ -18,22 +35,31 @@ class_details = {
         "Kanker otak pituitari disebut juga tumor hipofisis atau adenoma pituitari, adalah pertumbuhan sel abnormal di kelenjar pituitari yang menekan area sekitarnya dan mengganggu produksi hormon. Tumor ini sebagian besar bersifat jinak (bukan kanker), namun dapat menyebabkan gejala seperti sakit kepala, gangguan penglihatan, dan masalah hormonal, karena ukurannya yang semakin membesar atau aktivitasnya dalam menghasilkan hormon."
 }
 
-model_types = {
-    'resnet50v2': './saved/resnet50v2/fine_tuning/quantized_model.keras',
-    'vgg16': './saved/vgg16/fine_tuning/quantized_model.keras',
-    'mobilenetv2': './saved/mobilenetv2/fine_tuning/model.keras'
-}
+@st.cache_resource
+def get_model_pool():
+    pool = ModelPool(memory_budget_mb=MODEL_MEMORY_BUDGET_MB)
+    if not INFERENCE_SERVER_URL:
+        pool.preload(model_path(DEFAULT_MODEL), model_type=DEFAULT_MODEL)
+    return pool
 
 @st.cache_resource
-def load_model(model_path):
-    model = keras.models.load_model(model_path)
-    return model
+def get_cascade_predictor(model_variant):
+    paths = {name: model_path(name, model_variant) for name in CASCADE_STAGES}
+    return CascadePredictor(paths, load_thresholds(thresholds_path(model_variant)), list(class_details.keys()),
+                            loader=lambda path, stage: model_pool.get(path, model_type=stage))
+
+@st.cache_resource
+def get_prediction_cache():
+    return PredictionCache(max_entries=PREDICTION_CACHE_SIZE, disk_path=PREDICTION_CACHE_PATH)
 
 st.set_page_config(
     page_title="Brain Tumor Identifier",
     layout="wide"
 )
 
+model_pool = get_model_pool()
+prediction_cache = get_prediction_cache()
+
 st.title("Brain Tumor X-ray Image Classifier")
 
 with st.container():
@@ -45,10 +71,16 @@ with st.container():
 
         uploaded_file = st.file_uploader("Upload an X-ray image", type=["png", "jpg", "jpeg"])
         if uploaded_file is not None:
-            image = Image.open(uploaded_file).convert('RGB')
-            col1, col2, col3 = st.columns([1, 2, 1])
-            with col2:
-                st.image(image, caption="Uploaded Image")
+            try:
+                with instrumentation.span('app.decode'):
+                    image = load_image(uploaded_file, IMAGE_SIZE, max_pixels=MAX_UPLOAD_PIXELS)
+                with instrumentation.span('app.preview'):
+                    preview = load_image(uploaded_file, PREVIEW_SIZE, max_pixels=MAX_UPLOAD_PIXELS, keep_aspect=True)
+                col1, col2, col3 = st.columns([1, 2, 1])
+                with col2:
+                    st.image(preview, caption="Uploaded Image")
+            except ImageTooLargeError as e:
+                st.error(f"Gambar terlalu besar: {e}")
         else:
             st.markdown(
                 """
@@ -90,8 +122,51 @@ with st.container():
             unsafe_allow_html=True
         )
 
-        model_name = st.selectbox("Pilih Model", options=["vgg16", "resnet50v2", "mobilenetv2"], index=0)
-        model = load_model(model_types[model_name])
+        model_options = ["vgg16", "resnet50v2", "mobilenetv2"] + ([] if INFERENCE_SERVER_URL else ["ensemble", "cascade"])
+        model_name = st.selectbox("Pilih Model", options=model_options, index=0)
+        members = ENSEMBLE_MODELS if model_name == "ensemble" else CASCADE_STAGES if model_name == "cascade" else [model_name]
+        model_variant = st.selectbox("Pilih Varian Model", options=available_variants(members) or ['keras'], index=0,
+                                     disabled=bool(INFERENCE_SERVER_URL))
+        if model_name == "ensemble":
+            ensemble_versions = member_versions(ENSEMBLE_MODELS, model_variant)
+            calibration = load_calibration(calibration_path(model_variant), ensemble_versions)
+            ensemble_mode = st.selectbox("Metode Gabungan", options=list(COMBINE_MODES) if calibration else ['mean'], index=0)
+            model = EnsemblePredictor({name: model_pool.get(model_path(name, model_variant), model_type=name)
+                                       for name in ENSEMBLE_MODELS}, list(class_details.keys()),
+                                      weights=calibration and calibration['weights'],
+                                      temperatures=calibration and calibration['temperatures'])
+        elif model_name == "cascade":
+            model = get_cascade_predictor(model_variant)
+        else:
+            model = None if INFERENCE_SERVER_URL else model_pool.get(model_path(model_name, model_variant), model_type=model_name)
+
+        explain_enabled = model_name in ENSEMBLE_MODELS and model_variant == 'keras' and not INFERENCE_SERVER_URL
+        show_gradcam = st.checkbox("Tampilkan Grad-CAM", value=False, disabled=not explain_enabled)
+
+        with st.expander("Statistik Model"):
+            pool_metrics = model_pool.metrics()
+            st.caption(f"Memori terpakai {pool_metrics['used_mb']:.0f} / {pool_metrics['memory_budget_mb']:.0f} MB, "
+                       f"RSS proses {pool_metrics['rss_mb']:.0f} MB")
+            if pool_metrics['models']:
+                st.dataframe(pd.DataFrame.from_dict(pool_metrics['models'], orient='index')[
+                    ['model_type', 'resident', 'load_s', 'warmup_s', 'size_mb', 'shared_mb', 'rss_delta_mb', 'hits', 'loads', 'evictions']
+                ])
+            if model_name == "cascade":
+                st.json(model.stats())
+            cache_stats = prediction_cache.stats()
+            st.caption(f"Cache prediksi: {cache_stats['hits']} hit ({cache_stats['disk_hits']} dari disk), "
+                       f"{cache_stats['misses']} miss, {cache_stats['memory_entries']}/{cache_stats['max_entries']} entri")
+            if instrumentation.is_enabled():
+                stage_stats = instrumentation.snapshot()
+                if stage_stats:
+                    st.dataframe(pd.DataFrame.from_dict(stage_stats, orient='index')[
+                        ['count', 'mean_ms', 'p50_ms', 'p95_ms', 'max_ms']
+                    ])
+                st.download_button("Unduh Metrik (Prometheus)", data=instrumentation.to_prometheus(),
+                                   file_name="metrics.prom", mime="text/plain")
+                if st.button("Rekam Profil TensorFlow (10 prediksi)"):
+                    if not instrumentation.request_trace(PROFILE_LOG_DIR, num_steps=10):
+                        st.caption("Perekaman profil masih berjalan")
 
         col1, col2 = st.columns(2)
         with col1:
@@ -108,7 +183,37 @@ with st.container():
 
         if uploaded_file is not None and predict_button:
 
-            probs = predict(model, image, list(class_details.keys()))
+            selected_path = model_name if model_name in ("ensemble", "cascade") else model_path(model_name, model_variant)
+            ensemble_probs = None
+            with instrumentation.span(f'app.predict.{model_name}'):
+                if model_name == "cascade":
+                    cascade_versions = {stage: model_version(path) for stage, path in model.models.items()}
+                    cache_key = prediction_cache.make_key(image, selected_path, version=json.dumps(cascade_versions, sort_keys=True),
+                                                          preprocess_config={'thresholds': model.thresholds})
+                    cascade_result = prediction_cache.get_or_compute(cache_key, lambda: model.predict(image))
+                    probs = cascade_result['probabilities']
+                    st.caption(f"Cascade berhenti di model {cascade_result['stage']}")
+                elif model_name == "ensemble":
+                    cache_key = prediction_cache.make_key(image, selected_path, version=json.dumps(ensemble_versions, sort_keys=True),
+                                                          preprocess_config={'mode': ensemble_mode, 'calibration': calibration})
+                    ensemble_result = prediction_cache.get_or_compute(cache_key, lambda: model.predict(image, mode=ensemble_mode))
+                    probs, ensemble_probs = ensemble_result['combined'], ensemble_result['per_model']
+                elif INFERENCE_SERVER_URL:
+                    cache_key = prediction_cache.make_key(image, selected_path, version=INFERENCE_SERVER_URL,
+                                                          preprocess_config={'model_type': model_name})
+                    probs = prediction_cache.get_or_compute(
+                        cache_key,
+                        lambda: predict_remote(image, model_name, server_url=INFERENCE_SERVER_URL)
+                    )
+                elif show_gradcam and explain_enabled:
+                    from src.utils.explain import explain_cached
+                    explanation = explain_cached(prediction_cache, model, selected_path, image,
+                                                 list(class_details.keys()), model_type=model_name)
+                    probs = explanation['probabilities']
+                else:
+                    from src.utils.model_utils import predict_cached
+                    probs = predict_cached(prediction_cache, model, selected_path, image,
+                                           list(class_details.keys()), model_type=model_name)
             data = pd.DataFrame(list(probs.items()), columns=["Class", "Probability"])
             data["Probability"] = data["Probability"] * 100
             best_class = max(probs, key=probs.get)
@@ -154,6 +259,16 @@ with st.container():
                     unsafe_allow_html=True
                 )
 
+            if show_gradcam and explain_enabled:
+                from src.utils.explain import overlay_heatmap
+                st.subheader("Area yang diperhatikan model (Grad-CAM)")
+                st.image(overlay_heatmap(preview, explanation['heatmap']), caption=f"Grad-CAM {model_name}")
+
+            if ensemble_probs is not None:
+                st.subheader("Probabilitas setiap model dalam ensemble")
+                per_model = pd.DataFrame(ensemble_probs).T * 100
+                st.dataframe(per_model.style.format("{:.1f}%"))
+
         else:
             st.markdown(
                 """
@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from src.serving.config import model_types, model_variants, model_path, IMAGE_SIZE
+
+SAMPLE_DIR = './data/predict_sample'
+LATENCY_METRICS = ('cold_import_s', 'cold_load_s', 'cold_first_call_s', 'p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_mb')
+THROUGHPUT_METRICS = ('throughput_ips',)
+
+
+def benchmark_targets() -> Dict[str, dict]:
+    targets = {}
+    for model_type in model_types:
+        for variant in model_variants:
+            targets[f"{model_type}/{variant}"] = {'model_type': model_type, 'path': model_path(model_type, variant)}
+        for mode in ('feature_extractor', 'fine_tuning', 'distilled'):
+            targets[f"{model_type}/{mode}_float"] = {'model_type': model_type,
+                                                    'path': f'./saved/{model_type}/{mode}/model.keras'}
+            targets[f"{model_type}/{mode}_shared"] = {'model_type': model_type,
+                                                     'path': f'./saved/{model_type}/{mode}/model.shared'}
+    return {name: target for name, target in targets.items() if os.path.exists(target['path'])}
+
+
+def load_sample_images(img_size=IMAGE_SIZE):
+    import numpy as np
+    from PIL import Image
+
+    images = []
+    for filename in sorted(os.listdir(SAMPLE_DIR)):
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+            image = Image.open(os.path.join(SAMPLE_DIR, filename)).convert('RGB').resize(img_size)
+            images.append(np.asarray(image, dtype=np.float32))
+    return np.stack(images)
+
+
+def run_worker(model_path: str, model_type: str, threads: int, batch_sizes: List[int], num_runs: int) -> dict:
+    start = time.perf_counter()
+    import numpy as np
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+    from src.data_preprocessing.basic_preprocessing import preprocess_images
+    from src.utils.model_utils import get_forward_fn
+    from src.utils.quantization import TFLiteModel, load_variant
+    import_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model = load_variant(model_path, num_threads=threads)
+    load_s = time.perf_counter() - start
+
+    if isinstance(model, TFLiteModel):
+        forward = lambda x: model.predict(x.numpy())
+    else:
+        forward = get_forward_fn(model, img_size=IMAGE_SIZE)
+
+    samples = preprocess_images(load_sample_images(), img_size=IMAGE_SIZE, model_type=model_type)
+    start = time.perf_counter()
+    np.asarray(forward(samples[:1]))
+    first_call_s = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    results = []
+    for batch_size in batch_sizes:
+        inputs = {
+            'sample': tf.gather(samples, np.arange(batch_size) % samples.shape[0]),
+            'synthetic': preprocess_images(rng.uniform(0, 255, size=(batch_size, *IMAGE_SIZE, 3)),
+                                           img_size=IMAGE_SIZE, model_type=model_type),
+        }
+        for input_name, x in inputs.items():
+            for _ in range(3): np.asarray(forward(x))
+
+            latencies = []
+            for _ in range(num_runs):
+                start = time.perf_counter()
+                np.asarray(forward(x))
+                latencies.append(time.perf_counter() - start)
+
+            latencies_ms = 1000 * np.array(latencies)
+            results.append({
+                'batch_size': batch_size,
+                'input': input_name,
+                'p50_ms': float(np.percentile(latencies_ms, 50)),
+                'p95_ms': float(np.percentile(latencies_ms, 95)),
+                'p99_ms': float(np.percentile(latencies_ms, 99)),
+                'throughput_ips': float(batch_size * 1000 / latencies_ms.mean()),
+            })
+
+    import resource
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    for result in results:
+        result.update({'cold_import_s': import_s, 'cold_load_s': load_s,
+                       'cold_first_call_s': first_call_s, 'peak_rss_mb': peak_rss_mb})
+    return {'results': results}
+
+
+def run_benchmarks(targets: Dict[str, dict], thread_counts: List[int], batch_sizes: List[int], num_runs: int) -> dict:
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': [],
+    }
+
+    for name, target in targets.items():
+        for threads in thread_counts:
+            print(f"Benchmarking {name} with {threads} threads")
+            command = [sys.executable, '-m', 'src.benchmark.benchmark', '--worker',
+                       '--model-path', target['path'], '--model-type', target['model_type'],
+                       '--threads', str(threads), '--num-runs', str(num_runs),
+                       '--batch-sizes', *map(str, batch_sizes)]
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            worker_results = json.loads(output.strip().splitlines()[-1])['results']
+            for result in worker_results:
+                report['results'].append({'name': name, 'path': target['path'], 'threads': threads, **result})
+
+    return report
+
+
+def compare_reports(current: dict, baseline: dict, tolerance: float = 0.1) -> List[dict]:
+    key = lambda r: (r['name'], r['threads'], r['batch_size'], r['input'])
+    baseline_results = {key(r): r for r in baseline['results']}
+
+    regressions = []
+    for result in current['results']:
+        previous = baseline_results.get(key(result))
+        if previous is None: continue
+
+        for metric in LATENCY_METRICS:
+            if previous[metric] > 0 and result[metric] > previous[metric] * (1 + tolerance):
+                regressions.append({'key': key(result), 'metric': metric,
+                                    'baseline': previous[metric], 'current': result[metric]})
+        for metric in THROUGHPUT_METRICS:
+            if result[metric] < previous[metric] * (1 - tolerance):
+                regressions.append({'key': key(result), 'metric': metric,
+                                    'baseline': previous[metric], 'current': result[metric]})
+
+    for regression in regressions:
+        change = regression['current'] / regression['baseline'] - 1
+        print(f"REGRESSION {regression['key']} {regression['metric']}: "
+              f"{regression['baseline']:.3f} -> {regression['current']:.3f} ({change:+.1%})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Inference benchmark across backbones, variants, batch sizes and threads")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--models', nargs='+', default=None, help="Target names, defaults to every existing model file")
+    parser.add_argument('--threads', nargs='+', type=int, default=[1, os.cpu_count() or 1])
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8, 32])
+    parser.add_argument('--num-runs', type=int, default=50)
+    parser.add_argument('--compare', default=None, help="Baseline JSON to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--model-path', help=argparse.SUPPRESS)
+    parser.add_argument('--model-type', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_worker(args.model_path, args.model_type, args.threads[0], args.batch_sizes, args.num_runs)))
+        return
+
+    targets = benchmark_targets()
+    if args.models: targets = {name: targets[name] for name in args.models}
+
+    report = run_benchmarks(targets, args.threads, args.batch_sizes, args.num_runs)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare_reports(report, baseline, args.tolerance): sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
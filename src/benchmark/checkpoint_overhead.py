@@ -0,0 +1,86 @@
+import argparse
+import json
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+CHECKPOINT_MODES = {
+    'none': None,
+    'sync': {'background': False},
+    'async': {'background': True},
+}
+
+
+def measure_checkpoint_overhead(model_type: str,
+                                train_dir: str,
+                                test_dir: str,
+                                modes: Optional[List[str]] = None,
+                                fine_tune: bool = True,
+                                epochs: int = 2,
+                                train_batches: int = 40,
+                                save_every_steps: int = 10,
+                                batch_size: int = 32,
+                                num_classes: int = 4) -> List[Dict]:
+    from src.data_preprocessing.load_data import load_data
+    from src.data_preprocessing.basic_preprocessing import preprocess_data
+    from src.modeling.modeling import MODEL_FACTORIES, create_head_classifier
+    from src.training.checkpointing import AsyncCheckpointer
+    from src.training.training import train_model
+
+    trainset, validset, _ = load_data(train_dir, test_dir, batch_size=batch_size, color_mode='rgb')
+    trainset = preprocess_data(trainset, img_size=(224, 224), model_type=model_type).take(train_batches).cache()
+    validset = preprocess_data(validset, img_size=(224, 224), model_type=model_type).take(2).cache()
+
+    results = []
+    for mode in modes or list(CHECKPOINT_MODES):
+        print(f"Training {model_type} with {mode} checkpointing")
+        model = MODEL_FACTORIES[model_type](input_shape=(224, 224, 3), fine_tune=fine_tune,
+                                            head_classifier=create_head_classifier, num_classes=num_classes)
+        model.fit(trainset.take(1), epochs=1, verbose=0)
+
+        checkpoint_dir = tempfile.mkdtemp(prefix='checkpoints-')
+        checkpointer = None
+        if CHECKPOINT_MODES[mode] is not None:
+            checkpointer = AsyncCheckpointer(checkpoint_dir, save_every_epochs=1, save_every_steps=save_every_steps,
+                                             **CHECKPOINT_MODES[mode])
+
+        start = time.perf_counter()
+        train_model(model, trainset, validset, batch_size=batch_size, epochs=epochs, checkpointer=checkpointer)
+        train_s = time.perf_counter() - start
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+        results.append({
+            'model_type': model_type,
+            'mode': mode,
+            'step_time_ms': 1000 * train_s / (epochs * train_batches),
+            **(checkpointer.overhead() if checkpointer else {}),
+        })
+
+    baseline = results[0]
+    for result in results:
+        result['step_time_overhead'] = result['step_time_ms'] / baseline['step_time_ms'] - 1
+        print(f"{result['mode']:>6}: {result['step_time_ms']:.1f} ms/step ({100 * result['step_time_overhead']:+.1f}%)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the step-time overhead of synchronous and background checkpointing")
+    parser.add_argument('--model-type', default='vgg16', choices=['vgg16', 'resnet50v2', 'mobilenetv2'])
+    parser.add_argument('--train-dir', default='./data/raw/Training/')
+    parser.add_argument('--test-dir', default='./data/raw/Testing/')
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--train-batches', type=int, default=40)
+    parser.add_argument('--save-every-steps', type=int, default=10)
+    parser.add_argument('--output', default='checkpoint_overhead.json')
+    args = parser.parse_args()
+
+    results = measure_checkpoint_overhead(args.model_type, args.train_dir, args.test_dir, epochs=args.epochs,
+                                          train_batches=args.train_batches, save_every_steps=args.save_every_steps)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import json
+import time
+from typing import Dict, List, Optional
+
+PERF_MODES = {
+    'default': {},
+    'xla': {'jit_compile': True},
+    'xla_spe8': {'jit_compile': True, 'steps_per_execution': 8},
+    'mixed_bfloat16': {'dtype_policy': 'mixed_bfloat16'},
+    'xla_mixed_bfloat16': {'jit_compile': True, 'steps_per_execution': 8, 'dtype_policy': 'mixed_bfloat16'},
+}
+
+
+def compare_perf_modes(model_type: str,
+                       train_dir: str,
+                       test_dir: str,
+                       modes: Optional[List[str]] = None,
+                       fine_tune: bool = False,
+                       epochs: int = 1,
+                       train_batches: int = 20,
+                       eval_batches: int = 10,
+                       batch_size: int = 32,
+                       num_classes: int = 4) -> List[Dict]:
+    import tensorflow as tf
+    from src.data_preprocessing.load_data import load_data
+    from src.data_preprocessing.basic_preprocessing import preprocess_data
+    from src.evaluation.evaluation import evaluate_models
+    from src.modeling.modeling import MODEL_FACTORIES, create_head_classifier
+    from src.utils.model_utils import run_forward
+
+    trainset, validset, testset = load_data(train_dir, test_dir, batch_size=batch_size, color_mode='rgb')
+    class_names = testset.class_names
+    trainset = preprocess_data(trainset, img_size=(224, 224), model_type=model_type).take(train_batches).cache()
+    validset = preprocess_data(validset, img_size=(224, 224), model_type=model_type).take(eval_batches).cache()
+    testset = preprocess_data(testset, img_size=(224, 224), model_type=model_type).take(eval_batches).cache()
+
+    results = []
+    for mode in modes or list(PERF_MODES):
+        options = PERF_MODES[mode]
+        print(f"Running {model_type} in {mode} mode")
+        model = MODEL_FACTORIES[model_type](input_shape=(224, 224, 3), fine_tune=fine_tune,
+                                            head_classifier=create_head_classifier,
+                                            num_classes=num_classes, **options)
+
+        model.fit(trainset.take(1), epochs=1, verbose=0)
+        start = time.perf_counter()
+        history = model.fit(trainset, validation_data=validset, epochs=epochs, verbose=0)
+        train_s = time.perf_counter() - start
+
+        images = tf.concat([x for x, _ in testset], axis=0)
+        run_forward(model, images[:batch_size], batch_size=batch_size, jit_compile=options.get('jit_compile', False))
+        start = time.perf_counter()
+        run_forward(model, images, batch_size=batch_size, jit_compile=options.get('jit_compile', False))
+        inference_s = time.perf_counter() - start
+
+        evaluation = evaluate_models({mode: model}, testset, class_names)[mode]
+        results.append({
+            'model_type': model_type,
+            'mode': mode,
+            **options,
+            'train_steps_per_sec': epochs * train_batches / train_s,
+            'inference_images_per_sec': int(images.shape[0]) / inference_s,
+            'final_val_loss': float(history.history['val_loss'][-1]),
+            'test_loss': float(evaluation['loss']),
+            'test_accuracy': float(evaluation['accuracy']),
+        })
+
+    baseline = results[0]
+    for result in results:
+        result['train_speedup'] = result['train_steps_per_sec'] / baseline['train_steps_per_sec']
+        result['inference_speedup'] = result['inference_images_per_sec'] / baseline['inference_images_per_sec']
+        result['accuracy_delta'] = result['test_accuracy'] - baseline['test_accuracy']
+        print(f"{result['mode']:>20}: train x{result['train_speedup']:.2f}, "
+              f"inference x{result['inference_speedup']:.2f}, accuracy {result['accuracy_delta']:+.4f}")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare XLA, multi-step execution and mixed precision against the defaults")
+    parser.add_argument('--model-type', default='mobilenetv2', choices=['vgg16', 'resnet50v2', 'mobilenetv2'])
+    parser.add_argument('--train-dir', default='./data/raw/Training/')
+    parser.add_argument('--test-dir', default='./data/raw/Testing/')
+    parser.add_argument('--modes', nargs='+', choices=list(PERF_MODES), default=None)
+    parser.add_argument('--fine-tune', action='store_true')
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--train-batches', type=int, default=20)
+    parser.add_argument('--output', default='perf_modes.json')
+    args = parser.parse_args()
+
+    results = compare_perf_modes(args.model_type, args.train_dir, args.test_dir, args.modes,
+                                 fine_tune=args.fine_tune, epochs=args.epochs, train_batches=args.train_batches)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,41 @@
-from typing import Tuple
+from typing import Optional, Tuple
 import tensorflow as tf
 from tensorflow.data import Dataset
 import keras
+from src.utils.instrumentation import span, timed_map_fn
 
-def preprocess_data(dataset: Dataset, 
-                    img_size: Tuple[int, int], 
-                    normalize: bool = True,
-                    model_type: str = '') -> Dataset:
+def normalize_fn(x, model_type: str = ''):
+    if model_type == 'mobilenetv2':
+        return keras.applications.mobilenet_v2.preprocess_input(x)
+    elif model_type == 'vgg16':
+        return keras.applications.vgg16.preprocess_input(x)
+    elif model_type == 'resnet50v2':
+        return keras.applications.resnet50.preprocess_input(x)
+    else:
+        return x / 255.0
 
-    def normalize_fn(x, model_type):
-        if not normalize:
-            return x
-        elif model_type == 'mobilenetv2':
-            return keras.applications.mobilenet_v2.preprocess_input(x)
-        elif model_type == 'vgg16':
-            return keras.applications.vgg16.preprocess_input(x)
-        elif model_type == 'resnet50v2':
-            return keras.applications.resnet50.preprocess_input(x)
-        else:
-            return x / 255.0
+def preprocess_data(dataset: Dataset,
+                    img_size: Tuple[int, int],
+                    normalize: bool = True,
+                    model_type: str = '',
+                    num_parallel_calls: Optional[int] = None,
+                    deterministic: Optional[bool] = None) -> Dataset:
 
     def preprocess_fn(x, y):
         x = tf.image.resize(x, img_size)
-        x = normalize_fn(x, model_type)
+        if normalize: x = normalize_fn(x, model_type)
         return x, y
 
-    dataset = dataset.map(preprocess_fn)
+    dataset = dataset.map(timed_map_fn('preprocess_data.map', preprocess_fn),
+                          num_parallel_calls=num_parallel_calls, deterministic=deterministic)
     return dataset
+
+def preprocess_images(images: tf.Tensor,
+                      img_size: Tuple[int, int],
+                      normalize: bool = True,
+                      model_type: str = '') -> tf.Tensor:
+
+    with span('preprocess_images'):
+        images = tf.image.resize(tf.cast(images, tf.float32), img_size)
+        if normalize: images = normalize_fn(images, model_type)
+    return images
@@ -1,15 +1,24 @@
 from keras import layers, Sequential
 from tensorflow.data import Dataset
+from typing import Optional
+from src.utils.instrumentation import timed_map_fn
 
-def augment_data(dataset: Dataset) -> Dataset:
-    
-    data_augmentation = Sequential([
+def create_augmentation() -> Sequential:
+    return Sequential([
         layers.RandomFlip("horizontal"),
         layers.RandomRotation(0.2),
         layers.RandomZoom(0.2),
         layers.RandomContrast(0.2),
         layers.RandomBrightness(0.2),
     ])
+
+def augment_data(dataset: Dataset,
+                 num_parallel_calls: Optional[int] = None,
+                 deterministic: Optional[bool] = None) -> Dataset:
+    
+    data_augmentation = create_augmentation()
     
-    dataset = dataset.map(lambda x, y: (data_augmentation(x, training=True), y))
-    return dataset
\ No newline at end of file
+    dataset = dataset.map(timed_map_fn('augment_data.map', lambda x, y: (data_augmentation(x, training=True), y)),
+                          num_parallel_calls=num_parallel_calls,
+                          deterministic=deterministic)
+    return dataset
@@ -0,0 +1,125 @@
+import argparse
+import io
+import json
+import multiprocessing
+import time
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_MAX_PIXELS = 100_000_000
+RESIZABLE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'I', 'F')
+
+
+class ImageTooLargeError(ValueError):
+    pass
+
+
+def open_image(source: Union[str, bytes, io.IOBase], max_pixels: Optional[int] = DEFAULT_MAX_PIXELS) -> Image.Image:
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    elif hasattr(source, 'seek'):
+        source.seek(0)
+
+    image = Image.open(source)
+    if max_pixels and image.width * image.height > max_pixels:
+        raise ImageTooLargeError(f"Image of {image.width}x{image.height} pixels exceeds the limit of {max_pixels} pixels")
+    return image
+
+
+def load_image(source: Union[str, bytes, io.IOBase],
+               size: Tuple[int, int] = (224, 224),
+               max_pixels: Optional[int] = DEFAULT_MAX_PIXELS,
+               keep_aspect: bool = False,
+               resample: int = Image.BILINEAR) -> Image.Image:
+
+    image = open_image(source, max_pixels)
+    image.draft(None, size)
+    if image.mode not in RESIZABLE_MODES:
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    if keep_aspect:
+        image.thumbnail(size, resample, reducing_gap=3.0)
+    elif image.size != tuple(size):
+        image = image.resize(size, resample, reducing_gap=3.0)
+    return image.convert('RGB')
+
+
+def load_image_array(source: Union[str, bytes, io.IOBase],
+                     size: Tuple[int, int] = (224, 224),
+                     max_pixels: Optional[int] = DEFAULT_MAX_PIXELS) -> np.ndarray:
+    return np.asarray(load_image(source, size, max_pixels), dtype=np.float32)
+
+
+def _full_resolution_array(path: str, size: Tuple[int, int]) -> np.ndarray:
+    import tensorflow as tf
+    image = Image.open(path).convert('RGB')
+    return tf.image.resize(tf.convert_to_tensor(np.array(image), dtype=tf.float32), size).numpy()
+
+
+def _initialize_tensorflow():
+    import tensorflow as tf
+    tf.zeros(()).numpy()
+
+
+def _measure_ingestion(path: str, method: str, size: Tuple[int, int], num_runs: int, result_queue):
+    import resource
+
+    if method == 'full_resolution':
+        _initialize_tensorflow()
+        decode = _full_resolution_array
+    else:
+        decode = load_image_array
+
+    baseline_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    decode(path, size)
+
+    latencies = []
+    for _ in range(num_runs):
+        start = time.perf_counter()
+        decode(path, size)
+        latencies.append(time.perf_counter() - start)
+
+    result_queue.put({
+        'method': method,
+        'latency_ms': 1000 * float(np.median(latencies)),
+        'peak_rss_delta_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - baseline_rss_mb,
+    })
+
+
+def ingestion_report(path: str, size: Tuple[int, int] = (224, 224), num_runs: int = 10) -> dict:
+    context = multiprocessing.get_context('spawn')
+    with Image.open(path) as image:
+        report = {'path': path, 'format': image.format, 'mode': image.mode, 'size': list(image.size), 'methods': []}
+
+    for method in ('full_resolution', 'downscaled'):
+        result_queue = context.Queue()
+        process = context.Process(target=_measure_ingestion, args=(path, method, size, num_runs, result_queue))
+        process.start()
+        report['methods'].append(result_queue.get())
+        process.join()
+
+    full, downscaled = report['methods']
+    report['speedup'] = full['latency_ms'] / downscaled['latency_ms']
+    for result in report['methods']:
+        print(f"{result['method']:>16}: {result['latency_ms']:.1f} ms, peak RSS +{result['peak_rss_delta_mb']:.1f} MB")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full-resolution decoding with decode-time downscaling")
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--num-runs', type=int, default=10)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    reports = [ingestion_report(path, num_runs=args.num_runs) for path in args.paths]
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"Ingestion report saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.data_preprocessing.materialize import IMAGE_EXTENSIONS
+
+DEFAULT_MANIFEST_PATH = './data/processed/manifest.sqlite'
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def connect(manifest_path: str = DEFAULT_MANIFEST_PATH) -> sqlite3.Connection:
+    manifest_dir = os.path.dirname(manifest_path)
+    if manifest_dir: os.makedirs(manifest_dir, exist_ok=True)
+    db = sqlite3.connect(manifest_path)
+    db.execute("""CREATE TABLE IF NOT EXISTS images (
+        path TEXT PRIMARY KEY, split TEXT, class_name TEXT, content_hash TEXT, dhash TEXT,
+        width INTEGER, height INTEGER, size INTEGER, mtime_ns INTEGER, error TEXT)""")
+    if 'error' not in {row[1] for row in db.execute("PRAGMA table_info(images)")}:
+        db.execute("ALTER TABLE images ADD COLUMN error TEXT")
+    db.execute("CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, mtime_ns INTEGER)")
+    db.execute("CREATE INDEX IF NOT EXISTS images_split ON images (split)")
+    db.execute("CREATE INDEX IF NOT EXISTS images_hash ON images (content_hash)")
+    db.commit()
+    return db
+
+
+def content_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def difference_hash(image, hash_size: int = 8) -> str:
+    from PIL import Image
+
+    image.draft('L', (hash_size + 1, hash_size))
+    pixels = np.asarray(image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return f"{int(''.join('1' if bit else '0' for bit in bits), 2):016x}"
+
+
+def index_file(path: str) -> dict:
+    from src.data_preprocessing.image_io import open_image
+
+    stat = os.stat(path)
+    with open_image(path, max_pixels=None) as image:
+        width, height = image.size
+        dhash = difference_hash(image)
+    return {'content_hash': content_hash(path), 'dhash': dhash, 'width': width, 'height': height,
+            'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'error': None}
+
+
+def _index_or_error(path: str) -> dict:
+    try:
+        return index_file(path)
+    except Exception as e:
+        record = {'content_hash': None, 'dhash': None, 'width': None, 'height': None,
+                  'size': None, 'mtime_ns': None, 'error': f"{type(e).__name__}: {e}"}
+        with contextlib.suppress(OSError):
+            stat = os.stat(path)
+            record.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        return record
+
+
+def _changed_directories(db: sqlite3.Connection, root: str, full: bool) -> Tuple[List[str], List[str]]:
+    known = dict(db.execute("SELECT path, mtime_ns FROM directories"))
+    changed, seen = [], []
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        seen.append(directory)
+        mtime_ns = os.stat(directory).st_mtime_ns
+        subdirectories = [path for path in known if os.path.dirname(path) == directory]
+        if full or known.get(directory) != mtime_ns:
+            changed.append(directory)
+            with os.scandir(directory) as entries:
+                subdirectories = [entry.path for entry in entries if entry.is_dir()]
+        pending.extend(path for path in subdirectories if os.path.isdir(path))
+    return changed, seen
+
+
+def update_manifest(root: str = './data/raw',
+                    manifest_path: str = DEFAULT_MANIFEST_PATH,
+                    full: bool = False,
+                    num_workers: int = 8) -> dict:
+
+    start = time.perf_counter()
+    root = os.path.normpath(root)
+    db = connect(manifest_path)
+    changed_dirs, seen_dirs = _changed_directories(db, root, full)
+
+    to_index, present = [], set()
+    for directory in changed_dirs:
+        relative = os.path.relpath(directory, root).split(os.sep)
+        if len(relative) < 2 or relative[0] == '.':
+            continue
+        split, class_name = relative[0], relative[1]
+        prefix = directory + os.sep
+        indexed = {path: (size, mtime_ns) for path, size, mtime_ns in db.execute(
+            "SELECT path, size, mtime_ns FROM images WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+            if os.path.dirname(path) == directory}
+
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                present.add(entry.path)
+                stat = entry.stat()
+                if indexed.get(entry.path) != (stat.st_size, stat.st_mtime_ns):
+                    to_index.append((entry.path, split, class_name))
+
+        removed = [path for path in indexed if path not in present]
+        db.executemany("DELETE FROM images WHERE path = ?", [(path,) for path in removed])
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        records = list(executor.map(lambda item: _index_or_error(item[0]), to_index))
+    db.executemany(
+        "INSERT OR REPLACE INTO images (path, split, class_name, content_hash, dhash, width, height, size, mtime_ns, "
+        "error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(path, split, class_name, r['content_hash'], r['dhash'], r['width'], r['height'], r['size'], r['mtime_ns'],
+          r['error']) for (path, split, class_name), r in zip(to_index, records)]
+    )
+    failed = [(path, r['error']) for (path, _, _), r in zip(to_index, records) if r['error']]
+    for path, error in failed[:10]:
+        print(f"Could not index {path}: {error}")
+
+    missing_dirs = [path for (path,) in db.execute("SELECT path FROM directories") if not os.path.isdir(path)]
+    for path in missing_dirs:
+        db.execute("DELETE FROM images WHERE substr(path, 1, ?) = ?", (len(path) + 1, path + os.sep))
+    db.executemany("DELETE FROM directories WHERE path = ?", [(path,) for path in missing_dirs])
+    db.executemany("INSERT OR REPLACE INTO directories VALUES (?, ?)",
+                   [(path, os.stat(path).st_mtime_ns) for path in changed_dirs])
+    db.commit()
+
+    total = db.execute("SELECT COUNT(*) FROM images WHERE error IS NULL").fetchone()[0]
+    total_failed = db.execute("SELECT COUNT(*) FROM images WHERE error IS NOT NULL").fetchone()[0]
+    db.close()
+    summary = {'images': total, 'failed': total_failed, 'indexed': len(to_index), 'scanned_dirs': len(changed_dirs),
+               'known_dirs': len(seen_dirs), 'seconds': time.perf_counter() - start}
+    print(f"Manifest {manifest_path}: {total} images, {total_failed} unreadable, {len(to_index)} (re)indexed, "
+          f"{len(changed_dirs)}/{len(seen_dirs)} directories listed in {summary['seconds']:.2f}s")
+    return summary
+
+
+def read_split(split: str, manifest_path: str = DEFAULT_MANIFEST_PATH) -> List[dict]:
+    db = connect(manifest_path)
+    db.row_factory = sqlite3.Row
+    rows = [dict(row) for row in db.execute(
+        "SELECT * FROM images WHERE split = ? AND error IS NULL ORDER BY path", (split,))]
+    db.close()
+    return rows
+
+
+def stale_rows(rows: List[dict]) -> List[dict]:
+    stale = []
+    for row in rows:
+        try:
+            stat = os.stat(row['path'])
+        except OSError:
+            stale.append(row)
+            continue
+        if (stat.st_size, stat.st_mtime_ns) != (row['size'], row['mtime_ns']):
+            stale.append(row)
+    return stale
+
+
+def hamming_distances(hashes: np.ndarray, others: np.ndarray) -> np.ndarray:
+    xor = hashes[:, None] ^ others[None, :]
+    return POPCOUNT[xor.view(np.uint8)].reshape(*xor.shape, 8).sum(axis=-1)
+
+
+def leakage_report(train_split: str = 'Training',
+                   test_split: str = 'Testing',
+                   manifest_path: str = DEFAULT_MANIFEST_PATH,
+                   max_distance: int = 4,
+                   chunk_size: int = 256) -> dict:
+
+    train_rows, test_rows = read_split(train_split, manifest_path), read_split(test_split, manifest_path)
+    test_by_hash: Dict[str, List[dict]] = {}
+    for row in test_rows:
+        test_by_hash.setdefault(row['content_hash'], []).append(row)
+
+    exact = [{'train': row['path'], 'test': other['path'],
+              'train_class': row['class_name'], 'test_class': other['class_name']}
+             for row in train_rows for other in test_by_hash.get(row['content_hash'], [])]
+
+    near = []
+    if train_rows and test_rows:
+        train_hashes = np.array([int(row['dhash'], 16) for row in train_rows], dtype=np.uint64)
+        test_hashes = np.array([int(row['dhash'], 16) for row in test_rows], dtype=np.uint64)
+        for start in range(0, len(test_rows), chunk_size):
+            distances = hamming_distances(test_hashes[start:start + chunk_size], train_hashes)
+            for i, j in zip(*np.nonzero(distances <= max_distance)):
+                test_row, train_row = test_rows[start + i], train_rows[j]
+                if test_row['content_hash'] == train_row['content_hash']:
+                    continue
+                near.append({'train': train_row['path'], 'test': test_row['path'], 'distance': int(distances[i, j]),
+                             'train_class': train_row['class_name'], 'test_class': test_row['class_name']})
+
+    train_counts: Dict[str, int] = {}
+    for row in train_rows:
+        train_counts[row['content_hash']] = train_counts.get(row['content_hash'], 0) + 1
+
+    report = {
+        'train_images': len(train_rows),
+        'test_images': len(test_rows),
+        'exact_leaks': exact,
+        'near_leaks': near,
+        'leaked_test_images': len({leak['test'] for leak in exact + near}),
+        'train_duplicates': sum(count - 1 for count in train_counts.values() if count > 1),
+        'max_distance': max_distance,
+    }
+    print(f"{len(exact)} exact and {len(near)} near-duplicate (dHash distance <= {max_distance}) train/test pairs, "
+          f"{report['leaked_test_images']} of {len(test_rows)} test images affected, "
+          f"{report['train_duplicates']} duplicate images within {train_split}")
+    return report
+
+
+def manifest_dataset(rows: List[dict],
+                     class_names: List[str],
+                     img_size: Tuple[int, int] = (224, 224),
+                     batch_size: int = 32,
+                     shuffle: bool = False,
+                     seed: int = 42,
+                     color_mode: str = 'rgb'):
+    import tensorflow as tf
+
+    channels = 1 if color_mode == 'grayscale' else 3
+    paths = [row['path'] for row in rows]
+    labels = [class_names.index(row['class_name']) for row in rows]
+
+    def load_fn(path, label):
+        image = tf.io.decode_image(tf.io.read_file(path), channels=channels, expand_animations=False)
+        image = tf.image.resize(image, img_size)
+        return image, tf.one_hot(label, len(class_names))
+
+    dataset = tf.data.Dataset.from_tensor_slices((paths, labels))
+    if shuffle: dataset = dataset.shuffle(max(len(paths), 1), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.map(load_fn, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+    dataset = dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+    dataset.class_names = class_names
+    return dataset
+
+
+def load_manifest_data(manifest_path: str = DEFAULT_MANIFEST_PATH,
+                       train_split: str = 'Training',
+                       test_split: str = 'Testing',
+                       img_size: Tuple[int, int] = (224, 224),
+                       batch_size: int = 32,
+                       validation_split: Optional[float] = 0.2,
+                       seed: int = 42,
+                       color_mode: Optional[str] = 'rgb',
+                       exclude_leaks: bool = False,
+                       max_distance: int = 4):
+
+    train_rows, test_rows = read_split(train_split, manifest_path), read_split(test_split, manifest_path)
+    if not train_rows:
+        raise ValueError(f"No {train_split} images in {manifest_path}, run update_manifest first")
+    class_names = sorted({row['class_name'] for row in train_rows + test_rows})
+
+    stale = stale_rows(train_rows + test_rows)
+    if stale:
+        print(f"Warning: {len(stale)} images in {manifest_path} were changed or removed since they were indexed "
+              f"(e.g. {stale[0]['path']}). Incremental updates only list directories whose mtime changed, "
+              f"so in-place edits are missed; run update_manifest(full=True) or --full to refresh the index")
+
+    if exclude_leaks:
+        report = leakage_report(train_split, test_split, manifest_path, max_distance)
+        leaked = {leak['train'] for leak in report['exact_leaks'] + report['near_leaks']}
+        train_rows = [row for row in train_rows if row['path'] not in leaked]
+
+    validation_split = validation_split or 0.0
+    in_validation = lambda row: int(row['content_hash'][:8], 16) / 0xFFFFFFFF < validation_split
+    validset = manifest_dataset([row for row in train_rows if in_validation(row)], class_names, img_size,
+                                batch_size, seed=seed, color_mode=color_mode)
+    trainset = manifest_dataset([row for row in train_rows if not in_validation(row)], class_names, img_size,
+                                batch_size, shuffle=True, seed=seed, color_mode=color_mode)
+    testset = manifest_dataset(test_rows, class_names, img_size, batch_size, seed=seed, color_mode=color_mode)
+
+    return trainset, validset, testset
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally index data/raw and check train/test leakage")
+    parser.add_argument('--root', default='./data/raw')
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST_PATH)
+    parser.add_argument('--full', action='store_true', help="List every directory instead of only changed ones")
+    parser.add_argument('--leakage', action='store_true')
+    parser.add_argument('--max-distance', type=int, default=4)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    update_manifest(args.root, args.manifest, full=args.full)
+    if args.leakage:
+        report = leakage_report(manifest_path=args.manifest, max_distance=args.max_distance)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Leakage report saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
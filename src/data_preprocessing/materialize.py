@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+def list_class_files(data_dir: str) -> Tuple[List[str], List[int], List[str]]:
+    class_names = sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+    paths, labels = [], []
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(data_dir, class_name)
+        for dirpath, dirnames, filenames in os.walk(class_dir):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(dirpath, filename))
+                    labels.append(label)
+    return paths, labels, class_names
+
+def files_fingerprint(paths) -> str:
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        stat = os.stat(path)
+        digest.update(f"{path}|{stat.st_size}|{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def materialized_dir(processed_dir: str, split_name: str, img_size: Tuple[int, int], channels: int, seed: int) -> str:
+    return os.path.join(processed_dir, split_name, f"{img_size[0]}x{img_size[1]}x{channels}-seed{seed}")
+
+def materialize_dataset(data_dir: str,
+                        processed_dir: str = './data/processed',
+                        img_size: Tuple[int, int] = (224, 224),
+                        num_shards: int = 16,
+                        color_mode: str = 'rgb',
+                        seed: int = 42,
+                        overwrite: bool = False) -> str:
+
+    split_name = os.path.basename(os.path.normpath(data_dir))
+    channels = 1 if color_mode == 'grayscale' else 3
+    output_dir = materialized_dir(processed_dir, split_name, img_size, channels, seed)
+    meta_path = os.path.join(output_dir, 'meta.json')
+
+    paths, labels, class_names = list_class_files(data_dir)
+    fingerprint = files_fingerprint(paths)
+    if os.path.exists(meta_path) and not overwrite:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        expected = {'fingerprint': fingerprint, 'img_size': list(img_size), 'channels': channels,
+                    'num_shards': num_shards, 'seed': seed}
+        if all(meta.get(key) == value for key, value in expected.items()):
+            print(f"Materialized dataset already exists at {output_dir}")
+            return output_dir
+        print(f"Source images or settings changed, rebuilding {output_dir}")
+
+    split_keys = np.random.default_rng(seed).permutation(len(paths)) / max(len(paths), 1)
+
+    def load_fn(path, label, split_key):
+        image = tf.io.decode_image(tf.io.read_file(path), channels=channels, expand_animations=False)
+        image = tf.image.resize(image, img_size)
+        image = tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8)
+        return tf.io.serialize_tensor(image), label, split_key
+
+    dataset = tf.data.Dataset.from_tensor_slices((paths, labels, split_keys.astype(np.float32)))
+    dataset = dataset.map(load_fn, num_parallel_calls=tf.data.AUTOTUNE)
+
+    os.makedirs(output_dir, exist_ok=True)
+    for filename in os.listdir(output_dir):
+        if filename == 'meta.json' or filename.endswith('.tfrecord.gz'):
+            os.remove(os.path.join(output_dir, filename))
+
+    options = tf.io.TFRecordOptions(compression_type='GZIP')
+    shard_paths = [os.path.join(output_dir, f"shard-{i:05d}-of-{num_shards:05d}.tfrecord.gz") for i in range(num_shards)]
+    writers = [tf.io.TFRecordWriter(path, options) for path in shard_paths]
+
+    num_examples = 0
+    try:
+        for index, (image, label, split_key) in enumerate(dataset):
+            example = tf.train.Example(features=tf.train.Features(feature={
+                'image': tf.train.Feature(bytes_list=tf.train.BytesList(value=[image.numpy()])),
+                'label': tf.train.Feature(int64_list=tf.train.Int64List(value=[int(label)])),
+                'split_key': tf.train.Feature(float_list=tf.train.FloatList(value=[float(split_key)])),
+            }))
+            writers[index % num_shards].write(example.SerializeToString())
+            num_examples += 1
+    finally:
+        for writer in writers: writer.close()
+
+    meta = {
+        'class_names': class_names,
+        'num_examples': num_examples,
+        'img_size': list(img_size),
+        'channels': channels,
+        'num_shards': num_shards,
+        'seed': seed,
+        'source_dir': data_dir,
+        'fingerprint': fingerprint,
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+
+    print(f"Materialized {num_examples} images from {data_dir} into {output_dir}")
+    return output_dir
+
+def load_materialized(output_dir: str,
+                      batch_size: int = 32,
+                      split_range: Tuple[float, float] = (0.0, 1.0),
+                      shuffle: bool = False,
+                      seed: int = 42,
+                      buffer_size: int = 1000) -> tf.data.Dataset:
+
+    with open(os.path.join(output_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    num_classes = len(meta['class_names'])
+    image_shape = (*meta['img_size'], meta['channels'])
+
+    feature_spec = {
+        'image': tf.io.FixedLenFeature([], tf.string),
+        'label': tf.io.FixedLenFeature([], tf.int64),
+        'split_key': tf.io.FixedLenFeature([], tf.float32),
+    }
+
+    def parse_fn(record):
+        example = tf.io.parse_single_example(record, feature_spec)
+        image = tf.ensure_shape(tf.io.parse_tensor(example['image'], tf.uint8), image_shape)
+        label = tf.one_hot(example['label'], num_classes)
+        return tf.cast(image, tf.float32), label
+
+    def in_split(record):
+        split_key = tf.io.parse_single_example(record, {'split_key': feature_spec['split_key']})['split_key']
+        return tf.logical_and(split_key >= split_range[0], split_key < split_range[1])
+
+    files = tf.data.Dataset.list_files(os.path.join(output_dir, '*.tfrecord.gz'), shuffle=shuffle, seed=seed)
+    dataset = files.interleave(
+        lambda path: tf.data.TFRecordDataset(path, compression_type='GZIP'),
+        cycle_length=tf.data.AUTOTUNE,
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=not shuffle
+    )
+    if split_range != (0.0, 1.0): dataset = dataset.filter(in_split)
+    if shuffle: dataset = dataset.shuffle(buffer_size, seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.map(parse_fn, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+    dataset = dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+    dataset.class_names = meta['class_names']
+    return dataset
+
+def load_materialized_data(train_dir: str,
+                           test_dir: str,
+                           processed_dir: str = './data/processed',
+                           img_size: Tuple[int, int] = (224, 224),
+                           batch_size: int = 32,
+                           validation_split: Optional[float] = 0.2,
+                           seed: int = 42,
+                           color_mode: Optional[str] = 'rgb',
+                           num_shards: int = 16) -> Tuple[tf.data.Dataset, tf.data.Dataset, tf.data.Dataset]:
+
+    train_output = materialize_dataset(train_dir, processed_dir, img_size, num_shards, color_mode, seed)
+    test_output = materialize_dataset(test_dir, processed_dir, img_size, num_shards, color_mode, seed)
+
+    validation_split = validation_split or 0.0
+    trainset = load_materialized(train_output, batch_size, (validation_split, 1.0), shuffle=True, seed=seed)
+    validset = load_materialized(train_output, batch_size, (0.0, validation_split), seed=seed)
+    testset = load_materialized(test_output, batch_size)
+
+    return trainset, validset, testset
@@ -1,55 +1,144 @@
 import tensorflow as tf
 from keras.models import Model
 import numpy as np
-from sklearn.metrics import classification_report, confusion_matrix
-from typing import List
+from sklearn.metrics import classification_report
+from typing import Dict, List, Optional
 import matplotlib.pyplot as plt
 import seaborn as sns
+from src.data_preprocessing.basic_preprocessing import normalize_fn
 
-def evaluate_model(model: Model, test_dataset: tf.data.Dataset, class_names: List[str], save_path=None) -> tuple:
+class StreamingEvaluator:
 
-    eval_metrics = model.evaluate(test_dataset)
-    
-    test_loss = float(eval_metrics[0])
-    test_accuracy = float(eval_metrics[1])
-    
-    print(f"Test loss: {test_loss:.4f}")
-    print(f"Test accuracy: {test_accuracy:.4f}")
+    def __init__(self, num_classes: int, epsilon: float = 1e-7):
+        self.num_classes = num_classes
+        self.epsilon = epsilon
+        self.loss_sum = 0.0
+        self.count = 0
+        self.confusion_matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+        self.y_true = []
+        self.y_pred = []
+
+    def update(self, y_true: np.ndarray, probs: np.ndarray):
+        if y_true.ndim > 1:
+            labels = np.argmax(y_true, axis=-1)
+            one_hot = y_true
+        else:
+            labels = y_true.astype(np.int64)
+            one_hot = np.eye(self.num_classes)[labels]
+
+        preds = np.argmax(probs, axis=-1)
+        probs = np.clip(probs / np.sum(probs, axis=-1, keepdims=True), self.epsilon, 1.0 - self.epsilon)
+
+        self.loss_sum += float(-np.sum(one_hot * np.log(probs)))
+        self.count += len(labels)
+        np.add.at(self.confusion_matrix, (labels, preds), 1)
+        self.y_true.append(labels)
+        self.y_pred.append(preds)
+
+    def result(self) -> dict:
+        cm = self.confusion_matrix
+        true_positives = np.diag(cm).astype(np.float64)
+        predicted = cm.sum(axis=0)
+        actual = cm.sum(axis=1)
+
+        return {
+            'loss': self.loss_sum / self.count if self.count else 0.0,
+            'accuracy': float(true_positives.sum() / self.count) if self.count else 0.0,
+            'confusion_matrix': cm,
+            'precision': np.divide(true_positives, predicted, out=np.zeros_like(true_positives), where=predicted > 0),
+            'recall': np.divide(true_positives, actual, out=np.zeros_like(true_positives), where=actual > 0),
+            'y_true': np.concatenate(self.y_true) if self.y_true else np.array([], dtype=np.int64),
+            'y_pred': np.concatenate(self.y_pred) if self.y_pred else np.array([], dtype=np.int64),
+        }
 
-    y_true = []
-    y_pred = []
+def evaluate_models(models: Dict[str, Model],
+                    test_dataset: tf.data.Dataset,
+                    class_names: List[str],
+                    model_types: Optional[Dict[str, str]] = None) -> Dict[str, dict]:
+    from src.utils.model_utils import get_forward_fn
+    from src.utils.quantization import TFLiteModel
+
+    num_classes = len(class_names) if class_names else test_dataset.element_spec[1].shape[-1]
+    evaluators = {name: StreamingEvaluator(num_classes) for name in models}
+    forward_fns = {}
 
     for x_batch, y_batch in test_dataset:
-        preds = model.predict(x_batch)
-        preds = np.argmax(preds, axis=-1)
+        y_batch = y_batch.numpy()
+        normalized = {}
 
-        y_batch = np.argmax(y_batch, axis=-1) if len(y_batch.shape) > 1 else y_batch.numpy()
-        y_true.extend(y_batch)
-        y_pred.extend(preds)
+        for name, model in models.items():
+            model_type = model_types.get(name) if model_types else None
+            if model_type is None:
+                inputs = x_batch
+            else:
+                if model_type not in normalized: normalized[model_type] = normalize_fn(tf.cast(x_batch, tf.float32), model_type)
+                inputs = normalized[model_type]
 
-    y_true = np.array(y_true)
-    y_pred = np.array(y_pred)
+            if name not in forward_fns:
+                if isinstance(model, TFLiteModel):
+                    forward_fns[name] = lambda x, model=model: model.predict(x.numpy())
+                else:
+                    forward = get_forward_fn(model, img_size=tuple(inputs.shape[1:3]), channels=inputs.shape[-1])
+                    forward_fns[name] = lambda x, forward=forward: forward(x).numpy()
+            evaluators[name].update(y_batch, forward_fns[name](tf.cast(inputs, tf.float32)))
 
-    report = classification_report(
-        y_true,
-        y_pred,
-        target_names=class_names if class_names else None
-    )
+    return {name: evaluator.result() for name, evaluator in evaluators.items()}
 
-    print("\n=== Classification Report ===")
-    print(report)
+def evaluate_saved_models(test_dataset: tf.data.Dataset,
+                          class_names: List[str],
+                          saved_dir: str = './saved',
+                          model_types: List[str] = ('vgg16', 'resnet50v2', 'mobilenetv2'),
+                          modes: List[str] = ('feature_extractor', 'fine_tuning')) -> Dict[str, dict]:
+    import os
+    from src.utils.quantization import load_variant
+
+    models, types = {}, {}
+    for model_type in model_types:
+        for mode in modes:
+            path = os.path.join(saved_dir, model_type, mode, 'model.keras')
+            if os.path.exists(path):
+                models[f"{model_type}/{mode}"] = load_variant(path)
+                types[f"{model_type}/{mode}"] = model_type
+
+    results = evaluate_models(models, test_dataset, class_names, model_types=types)
+    for name, result in results.items():
+        print(f"{name}: loss {result['loss']:.4f}, accuracy {result['accuracy']:.4f}")
+    return results
 
-    cm = confusion_matrix(y_true, y_pred)
+def plot_confusion_matrix(cm: np.ndarray, class_names: List[str], save_path=None, title='Confusion Matrix'):
 
     plt.figure(figsize=(8, 6))
     sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', xticklabels=class_names, yticklabels=class_names)
     plt.xlabel('Predicted Labels')
     plt.ylabel('True Labels')
-    plt.title('Confusion Matrix')
+    plt.title(title)
 
     if save_path:
         plt.savefig(save_path)
         print(f"Confusion matrix saved to {save_path}")
     plt.show()
 
+def evaluate_model(model: Model, test_dataset: tf.data.Dataset, class_names: List[str], save_path=None) -> tuple:
+
+    result = evaluate_models({'model': model}, test_dataset, class_names)['model']
+
+    test_loss = float(result['loss'])
+    test_accuracy = float(result['accuracy'])
+
+    print(f"Test loss: {test_loss:.4f}")
+    print(f"Test accuracy: {test_accuracy:.4f}")
+
+    report = classification_report(
+        result['y_true'],
+        result['y_pred'],
+        labels=list(range(len(class_names))) if class_names else None,
+        target_names=class_names if class_names else None
+    )
+
+    print("\n=== Classification Report ===")
+    print(report)
+
+    cm = result['confusion_matrix']
+    plot_confusion_matrix(cm, class_names, save_path=save_path)
+
     return test_loss, test_accuracy, report, cm
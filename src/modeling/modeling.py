@@ -1,8 +1,21 @@
 from keras.applications import ResNet50, VGG16, MobileNetV2
 from keras import layers, models
 from keras.models import Model
+import keras
+import contextlib
 from typing import Optional, Callable, Tuple
 
+BACKBONES = {
+    'resnet50v2': ResNet50,
+    'vgg16': VGG16,
+    'mobilenetv2': MobileNetV2,
+}
+
+def create_backbone(model_type: str, input_shape: Tuple[int, int, int] = (224, 224, 3)) -> Model:
+    base_model = BACKBONES[model_type](weights='imagenet', include_top=False, input_shape=input_shape)
+    base_model.trainable = False
+    return base_model
+
 def create_head_classifier(input_tensor, num_classes: int) -> models.Sequential:
     head_classifier = models.Sequential([
         layers.GlobalAveragePooling2D(),
@@ -10,80 +23,98 @@ def create_head_classifier(input_tensor, num_classes: int) -> models.Sequential:
         layers.Dense(256, activation='relu'),
         layers.BatchNormalization(),
         layers.Dropout(0.3),
-        layers.Dense(num_classes, activation='softmax')
+        layers.Dense(num_classes, activation='softmax', dtype='float32')
     ])
     return head_classifier(input_tensor)
 
+def compile_model(model: Model, jit_compile: bool = False, steps_per_execution: int = 1, optimizer='adam') -> Model:
+    model.compile(optimizer=optimizer,
+                  loss='categorical_crossentropy',
+                  metrics=['accuracy'],
+                  jit_compile=jit_compile,
+                  steps_per_execution=steps_per_execution)
+    return model
+
+def _create_model(model_type: str,
+                  input_shape: Tuple[int, int, int],
+                  fine_tune: bool,
+                  head_classifier: Optional[Callable],
+                  num_classes: int,
+                  show_info: bool,
+                  jit_compile: bool,
+                  steps_per_execution: int,
+                  dtype_policy: Optional[str],
+                  strategy=None) -> Model:
+
+    previous_policy = keras.mixed_precision.dtype_policy()
+    if dtype_policy: keras.mixed_precision.set_dtype_policy(dtype_policy)
+
+    try:
+        with strategy.scope() if strategy else contextlib.nullcontext():
+            base_model = BACKBONES[model_type](weights='imagenet', include_top=False, input_shape=input_shape)
+
+            base_model.trainable = False
+            if fine_tune:
+                for layer in base_model.layers[-4:]:
+                    layer.trainable = True
+
+            x = base_model.output
+            if head_classifier:
+                head_model = head_classifier(x, num_classes)
+            else:
+                x = layers.GlobalAveragePooling2D()(x)
+                head_model = layers.Dense(num_classes, activation='softmax', dtype='float32')(x)
+
+            model = models.Model(inputs=base_model.input, outputs=head_model)
+            compile_model(model, jit_compile=jit_compile, steps_per_execution=steps_per_execution)
+    finally:
+        keras.mixed_precision.set_dtype_policy(previous_policy)
+
+    if show_info: model.summary()
+    return model
+
 def create_resnet50_model(
-        input_shape: Tuple[int, int, int] = (224, 224, 3), 
+        input_shape: Tuple[int, int, int] = (224, 224, 3),
         fine_tune: bool = False,
         head_classifier: Optional[Callable] = None,
         num_classes: int = 2,
-        show_info: bool = False) -> Model:
+        show_info: bool = False,
+        jit_compile: bool = False,
+        steps_per_execution: int = 1,
+        dtype_policy: Optional[str] = None,
+        strategy=None) -> Model:
 
-    base_model = ResNet50(weights='imagenet', include_top=False, input_shape=input_shape)
-    
-    base_model.trainable = False
-    if fine_tune:
-        for layer in base_model.layers[-4:]:
-            layer.trainable = True
-    
-    x = base_model.output
-    if head_classifier:
-        head_model = head_classifier(x, num_classes)
-    else:
-        x = layers.GlobalAveragePooling2D()(x)
-        head_model = layers.Dense(num_classes, activation='softmax')(x)
-    
-    model = models.Model(inputs=base_model.input, outputs=head_model)
-    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
-    if show_info: model.summary()
-    return model
+    return _create_model('resnet50v2', input_shape, fine_tune, head_classifier, num_classes, show_info,
+                         jit_compile, steps_per_execution, dtype_policy, strategy)
 
-def create_vgg16_model(input_shape: Tuple[int, int, int] = (224, 224, 3), 
+def create_vgg16_model(input_shape: Tuple[int, int, int] = (224, 224, 3),
                        fine_tune: bool = False,
                        head_classifier: Optional[Callable] = None,
                        num_classes: int = 2,
-                       show_info: bool = False) -> Model:
+                       show_info: bool = False,
+                       jit_compile: bool = False,
+                       steps_per_execution: int = 1,
+                       dtype_policy: Optional[str] = None,
+                       strategy=None) -> Model:
 
-    base_model = VGG16(weights='imagenet', include_top=False, input_shape=input_shape)
-    
-    base_model.trainable = False
-    if fine_tune:
-        for layer in base_model.layers[-4:]:
-            layer.trainable = True
-    
-    x = base_model.output
-    if head_classifier:
-        head_model = head_classifier(x, num_classes)
-    else:
-        x = layers.GlobalAveragePooling2D()(x)
-        head_model = layers.Dense(num_classes, activation='softmax')(x)
-    
-    model = models.Model(inputs=base_model.input, outputs=head_model)
-    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
-    if show_info: model.summary()
-    return model
+    return _create_model('vgg16', input_shape, fine_tune, head_classifier, num_classes, show_info,
+                         jit_compile, steps_per_execution, dtype_policy, strategy)
 
-def create_mobilenetv2_model(input_shape: Tuple[int, int, int] = (224, 224, 3), 
+def create_mobilenetv2_model(input_shape: Tuple[int, int, int] = (224, 224, 3),
                              fine_tune: bool = False,
                              head_classifier: Optional[Callable] = None,
-                             num_classes: int = 2) -> Model:
+                             num_classes: int = 2,
+                             show_info: bool = False,
+                             jit_compile: bool = False,
+                             steps_per_execution: int = 1,
+                             dtype_policy: Optional[str] = None,
+                             strategy=None) -> Model:
 
-    base_model = MobileNetV2(weights='imagenet', include_top=False, input_shape=input_shape)
-    
-    base_model.trainable = False
-    if fine_tune:
-        for layer in base_model.layers[-4:]:
-            layer.trainable = True
-    
-    x = base_model.output
-    if head_classifier:
-        head_model = head_classifier(x, num_classes)
-    else:
-        x = layers.GlobalAveragePooling2D()(x)
-        head_model = layers.Dense(num_classes, activation='softmax')(x)
-    
-    model = models.Model(inputs=base_model.input, outputs=head_model)
-    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
-    return model
\ No newline at end of file
+    return _create_model('mobilenetv2', input_shape, fine_tune, head_classifier, num_classes, show_info,
+                         jit_compile, steps_per_execution, dtype_policy, strategy)
+
+MODEL_FACTORIES = {
+    'resnet50v2': create_resnet50_model,
+    'vgg16': create_vgg16_model,
+    'mobilenetv2': create_mobilenetv2_model,
+}
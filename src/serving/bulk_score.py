@@ -0,0 +1,251 @@
+import argparse
+import csv
+import os
+import time
+from typing import Iterable, List, Set, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from src.data_preprocessing.basic_preprocessing import normalize_fn
+from src.serving.config import model_types, class_names, IMAGE_SIZE
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def list_images(root_dir: str) -> List[str]:
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames.sort()
+        paths.extend(os.path.join(dirpath, f) for f in sorted(filenames) if f.lower().endswith(IMAGE_EXTENSIONS))
+    return paths
+
+
+def scored_paths(output_path: str, output_format: str) -> Set[str]:
+    if not os.path.exists(output_path):
+        return set()
+
+    if output_format == 'csv':
+        done = set()
+        with open(output_path, newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            for row in reader:
+                if header and len(row) == len(header): done.add(row[0])
+        return done
+
+    import pyarrow.parquet as pq
+    done = set()
+    for part in sorted(os.listdir(output_path)):
+        if part.endswith('.parquet'):
+            done.update(pq.read_table(os.path.join(output_path, part), columns=['path']).column('path').to_pylist())
+    return done
+
+
+def drop_failed_rows(output_path: str, output_format: str) -> int:
+    if not os.path.exists(output_path):
+        return 0
+
+    if output_format == 'csv':
+        truncate_partial_line(output_path)
+        tmp_path = output_path + '.tmp'
+        dropped = 0
+        with open(output_path, newline='') as f_in, open(tmp_path, 'w', newline='') as f_out:
+            reader, writer = csv.reader(f_in), csv.writer(f_out)
+            header = next(reader, None)
+            if header: writer.writerow(header)
+            for row in reader:
+                if header and len(row) == len(header) and row[-1]:
+                    dropped += 1
+                else:
+                    writer.writerow(row)
+        os.replace(tmp_path, output_path)
+        return dropped
+
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    dropped = 0
+    for part in sorted(os.listdir(output_path)):
+        if part.endswith('.parquet'):
+            part_path = os.path.join(output_path, part)
+            table = pq.read_table(part_path)
+            failed = pc.not_equal(pc.fill_null(table.column('error'), ''), '')
+            if pc.any(failed).as_py():
+                dropped += int(pc.sum(pc.cast(failed, 'int64')).as_py())
+                pq.write_table(table.filter(pc.invert(failed)), part_path + '.tmp')
+                os.replace(part_path + '.tmp', part_path)
+    return dropped
+
+
+def build_dataset(paths: List[str], model_type: str, img_size: Tuple[int, int], batch_size: int) -> tf.data.Dataset:
+
+    def load_fn(path):
+        image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+        image = tf.image.resize(tf.cast(image, tf.float32), img_size)
+        return path, normalize_fn(image, model_type)
+
+    dataset = tf.data.Dataset.from_tensor_slices(paths)
+    dataset = dataset.map(load_fn, num_parallel_calls=tf.data.AUTOTUNE, deterministic=True)
+    dataset = dataset.ignore_errors(log_warning=True)
+    dataset = dataset.batch(batch_size)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def truncate_partial_line(path: str, chunk_size: int = 1 << 16):
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - chunk_size)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b'\n')
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            f.truncate(position)
+            print(f"Dropped {end - position} bytes of a partially written row from {path}")
+
+
+class CsvResultWriter:
+
+    def __init__(self, output_path: str, columns: List[str]):
+        is_new = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        if not is_new:
+            truncate_partial_line(output_path)
+            with open(output_path, newline='') as f:
+                header = next(csv.reader(f), None)
+            if header != columns:
+                raise ValueError(f"{output_path} has columns {header}, expected {columns}")
+        self.file = open(output_path, 'a', newline='')
+        self.writer = csv.writer(self.file)
+        if is_new: self.writer.writerow(columns)
+
+    def write(self, rows: Iterable[list]):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetResultWriter:
+
+    def __init__(self, output_path: str, columns: List[str], rows_per_part: int = 1000, flush_interval_s: float = 60.0):
+        import pyarrow
+        self.pyarrow = pyarrow
+        self.output_path = output_path
+        self.columns = columns
+        self.rows_per_part = rows_per_part
+        self.flush_interval_s = flush_interval_s
+        self.last_flush = time.monotonic()
+        self.buffer = []
+        os.makedirs(output_path, exist_ok=True)
+        self.part_index = len([p for p in os.listdir(output_path) if p.endswith('.parquet')])
+
+    def write(self, rows: Iterable[list]):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.rows_per_part or time.monotonic() - self.last_flush >= self.flush_interval_s:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.buffer: return
+        import pyarrow.parquet as pq
+
+        table = self.pyarrow.table({name: [row[i] for row in self.buffer] for i, name in enumerate(self.columns)})
+        part_path = os.path.join(self.output_path, f"part-{self.part_index:05d}.parquet")
+        pq.write_table(table, part_path + '.tmp')
+        os.replace(part_path + '.tmp', part_path)
+        self.part_index += 1
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+
+
+def score_directory(input_dir: str,
+                    output_path: str,
+                    model,
+                    model_type: str,
+                    output_format: str = 'csv',
+                    img_size: Tuple[int, int] = IMAGE_SIZE,
+                    batch_size: int = 64,
+                    names: List[str] = class_names,
+                    rows_per_part: int = 1000,
+                    retry_failed: bool = False) -> int:
+    from src.utils.model_utils import get_forward_fn
+    from src.utils.quantization import TFLiteModel
+
+    if retry_failed:
+        dropped = drop_failed_rows(output_path, output_format)
+        if dropped: print(f"Removed {dropped} failed rows from {output_path} to score them again")
+    done = scored_paths(output_path, output_format)
+    paths = [p for p in list_images(input_dir) if p not in done]
+    print(f"Found {len(done) + len(paths)} images, {len(done)} already scored, {len(paths)} remaining")
+    if not paths: return 0
+
+    columns = ['path', 'predicted_class'] + [f"prob_{name}" for name in names] + ['error']
+    if output_format == 'csv':
+        writer = CsvResultWriter(output_path, columns)
+    else:
+        writer = ParquetResultWriter(output_path, columns, rows_per_part=rows_per_part)
+    failed_row = lambda path: [path, ''] + [float('nan')] * len(names) + ['could not read or decode image']
+    if isinstance(model, TFLiteModel):
+        forward = lambda x: tf.convert_to_tensor(model.predict(x.numpy()))
+    else:
+        forward = get_forward_fn(model, img_size=img_size)
+
+    scored, failed, next_index = 0, 0, 0
+    start = time.perf_counter()
+    try:
+        for batch_paths, images in build_dataset(paths, model_type, img_size, batch_size):
+            probs = forward(images).numpy()
+            best = np.argmax(probs, axis=-1)
+            rows = []
+            for p, b, prob in zip(batch_paths.numpy(), best, probs):
+                path = p.decode('utf-8')
+                index = paths.index(path, next_index)
+                rows.extend(failed_row(skipped) for skipped in paths[next_index:index])
+                failed += index - next_index
+                next_index = index + 1
+                rows.append([path, names[b]] + [float(v) for v in prob] + [''])
+            writer.write(rows)
+
+            scored += len(probs)
+            elapsed = time.perf_counter() - start
+            print(f"\rScored {scored}/{len(paths)} images ({scored / elapsed:.1f} img/s)", end='', flush=True)
+
+        if next_index < len(paths):
+            writer.write([failed_row(skipped) for skipped in paths[next_index:]])
+            failed += len(paths) - next_index
+    finally:
+        writer.close()
+        print()
+
+    if failed: print(f"{failed} images could not be read and were recorded with an error")
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every image under a directory tree and write results incrementally")
+    parser.add_argument('input_dir')
+    parser.add_argument('output_path', help="CSV file, or a directory of parquet parts when --format parquet")
+    parser.add_argument('--model-type', choices=list(model_types), default='vgg16')
+    parser.add_argument('--model-path', default=None, help="Defaults to the model_types entry of --model-type")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--rows-per-part', type=int, default=1000, help="Parquet rows buffered before a part is written")
+    parser.add_argument('--retry-failed', action='store_true', help="Score images recorded with an error again")
+    args = parser.parse_args()
+
+    from src.utils.quantization import load_variant
+    model = load_variant(args.model_path or model_types[args.model_type])
+    score_directory(args.input_dir, args.output_path, model, args.model_type,
+                    output_format=args.format, batch_size=args.batch_size,
+                    rows_per_part=args.rows_per_part, retry_failed=args.retry_failed)
+
+
+if __name__ == '__main__':
+    main()
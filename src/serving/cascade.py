@@ -0,0 +1,218 @@
+import argparse
+import itertools
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.serving.config import class_names as default_class_names, model_path, IMAGE_SIZE
+
+CASCADE_STAGES = ['mobilenetv2', 'resnet50v2', 'vgg16']
+PROB_GRID = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99)
+MARGIN_GRID = (0.0, 0.1, 0.2, 0.4, 0.6)
+DEFAULT_THRESHOLDS = {'mobilenetv2': (0.9, 0.2), 'resnet50v2': (0.8, 0.1)}
+
+
+def needs_escalation(probs: np.ndarray, min_prob: float, min_margin: float) -> np.ndarray:
+    top2 = np.sort(probs, axis=-1)[:, -2:]
+    return (top2[:, 1] < min_prob) | (top2[:, 1] - top2[:, 0] < min_margin)
+
+
+class CascadePredictor:
+
+    def __init__(self,
+                 models: Dict[str, object],
+                 thresholds: Dict[str, Tuple[float, float]],
+                 class_names: List[str] = default_class_names,
+                 stages: Sequence[str] = CASCADE_STAGES,
+                 img_size: Tuple[int, int] = IMAGE_SIZE,
+                 loader: Optional[Callable] = None):
+        self.models = models
+        self.loader = loader
+        self.thresholds = thresholds
+        self.class_names = class_names
+        self.stages = [stage for stage in stages if stage in models]
+        self.img_size = img_size
+
+        self._lock = threading.Lock()
+        self._entered = {stage: 0 for stage in self.stages}
+        self._exited = {stage: 0 for stage in self.stages}
+        self._latency = {stage: 0.0 for stage in self.stages}
+        self._batches = {stage: 0 for stage in self.stages}
+
+    def _model(self, stage: str):
+        return self.loader(self.models[stage], stage) if self.loader else self.models[stage]
+
+    def predict_probs(self, images) -> Tuple[np.ndarray, np.ndarray]:
+        from src.data_preprocessing.basic_preprocessing import normalize_fn
+        from src.utils.model_utils import resize_images, run_forward
+
+        resized = resize_images(images, self.img_size).numpy()
+        probs = np.zeros((len(resized), len(self.class_names)), dtype=np.float32)
+        exit_stage = np.full(len(resized), -1, dtype=np.int64)
+        pending = np.arange(len(resized))
+
+        for index, stage in enumerate(self.stages):
+            start = time.perf_counter()
+            stage_probs = run_forward(self._model(stage), normalize_fn(resized[pending], stage))
+            elapsed = time.perf_counter() - start
+
+            is_last = index == len(self.stages) - 1
+            escalate = np.zeros(len(pending), dtype=bool) if is_last else needs_escalation(stage_probs, *self.thresholds[stage])
+            done = pending[~escalate]
+            probs[done] = stage_probs[~escalate]
+            exit_stage[done] = index
+
+            with self._lock:
+                self._entered[stage] += len(pending)
+                self._exited[stage] += len(done)
+                self._latency[stage] += elapsed
+                self._batches[stage] += 1
+
+            pending = pending[escalate]
+            if len(pending) == 0: break
+
+        return probs, exit_stage
+
+    def predict_batch(self, images) -> List[dict]:
+        probs, exit_stage = self.predict_probs(images)
+        return [{
+            'probabilities': {self.class_names[i]: float(p[i]) for i in range(len(self.class_names))},
+            'stage': self.stages[stage],
+        } for p, stage in zip(probs, exit_stage)]
+
+    def predict(self, image) -> dict:
+        return self.predict_batch([image])[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._entered[self.stages[0]] if self.stages else 0
+            per_stage = {}
+            cascade_cost, full_cost = 0.0, 0.0
+            for stage in self.stages:
+                mean_latency = self._latency[stage] / self._batches[stage] if self._batches[stage] else 0.0
+                per_stage[stage] = {
+                    'entered': self._entered[stage],
+                    'exited': self._exited[stage],
+                    'exit_rate': self._exited[stage] / total if total else 0.0,
+                    'mean_batch_latency_ms': 1000 * mean_latency,
+                }
+                cascade_cost += self._latency[stage]
+
+            last = self.stages[-1] if self.stages else None
+            if last and self._entered[last]:
+                full_cost = self._latency[last] / self._entered[last] * total
+            return {
+                'requests': total,
+                'stages': per_stage,
+                'cost_vs_last_stage': cascade_cost / full_cost if full_cost else None,
+            }
+
+
+def thresholds_path(variant: str = 'keras') -> str:
+    return f'./saved/cascade_thresholds_{variant}.json'
+
+
+def load_thresholds(path: Optional[str] = None) -> Dict[str, Tuple[float, float]]:
+    import os
+    path = path or thresholds_path()
+    if not os.path.exists(path):
+        return dict(DEFAULT_THRESHOLDS)
+    with open(path) as f:
+        return {stage: tuple(values) for stage, values in json.load(f)['thresholds'].items()}
+
+
+def collect_stage_outputs(models: Dict[str, object], dataset, stages: Sequence[str] = CASCADE_STAGES):
+    from src.data_preprocessing.basic_preprocessing import normalize_fn
+    from src.utils.model_utils import run_forward
+
+    probs = {stage: [] for stage in stages}
+    latency = {stage: 0.0 for stage in stages}
+    labels = []
+    for x_batch, y_batch in dataset:
+        for stage in stages:
+            start = time.perf_counter()
+            probs[stage].append(run_forward(models[stage], normalize_fn(x_batch, stage)))
+            latency[stage] += time.perf_counter() - start
+        labels.append(np.argmax(y_batch.numpy(), axis=-1))
+
+    labels = np.concatenate(labels)
+    probs = {stage: np.concatenate(chunks) for stage, chunks in probs.items()}
+    per_image_latency = {stage: latency[stage] / len(labels) for stage in stages}
+    return probs, labels, per_image_latency
+
+
+def simulate_cascade(probs: Dict[str, np.ndarray], labels: np.ndarray, per_image_latency: Dict[str, float],
+                     thresholds: Dict[str, Tuple[float, float]], stages: Sequence[str] = CASCADE_STAGES) -> dict:
+    final = np.zeros(len(labels), dtype=np.int64)
+    pending = np.ones(len(labels), dtype=bool)
+    cost = 0.0
+    exit_rates = {}
+
+    for index, stage in enumerate(stages):
+        cost += per_image_latency[stage] * pending.sum()
+        if index == len(stages) - 1:
+            done = pending.copy()
+        else:
+            done = pending & ~needs_escalation(probs[stage], *thresholds[stage])
+        final[done] = np.argmax(probs[stage][done], axis=-1)
+        exit_rates[stage] = float(done.sum() / len(labels))
+        pending &= ~done
+
+    return {
+        'accuracy': float(np.mean(final == labels)),
+        'mean_latency_ms': 1000 * cost / len(labels),
+        'exit_rates': exit_rates,
+    }
+
+
+def calibrate_thresholds(probs: Dict[str, np.ndarray], labels: np.ndarray, per_image_latency: Dict[str, float],
+                         target_accuracy: float, stages: Sequence[str] = CASCADE_STAGES) -> Optional[dict]:
+    stage_grid = list(itertools.product(PROB_GRID, MARGIN_GRID))
+    best = None
+    for combination in itertools.product(stage_grid, repeat=len(stages) - 1):
+        thresholds = dict(zip(stages[:-1], combination))
+        result = simulate_cascade(probs, labels, per_image_latency, thresholds, stages)
+        if result['accuracy'] >= target_accuracy and (best is None or result['mean_latency_ms'] < best['mean_latency_ms']):
+            best = {'thresholds': thresholds, **result}
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune cascade escalation thresholds on the test split")
+    parser.add_argument('--train-dir', default='./data/raw/Training/')
+    parser.add_argument('--test-dir', default='./data/raw/Testing/')
+    parser.add_argument('--variant', default='keras')
+    parser.add_argument('--target-accuracy', type=float, default=0.95)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--output', default=None, help="Defaults to saved/cascade_thresholds_<variant>.json")
+    args = parser.parse_args()
+
+    from src.data_preprocessing.load_data import load_data
+    from src.utils.quantization import load_variant
+
+    _, _, testset = load_data(args.train_dir, args.test_dir, img_size=IMAGE_SIZE,
+                              batch_size=args.batch_size, color_mode='rgb')
+    models = {stage: load_variant(model_path(stage, args.variant)) for stage in CASCADE_STAGES}
+    probs, labels, per_image_latency = collect_stage_outputs(models, testset)
+
+    for stage in CASCADE_STAGES:
+        accuracy = float(np.mean(np.argmax(probs[stage], axis=-1) == labels))
+        print(f"{stage}: accuracy {accuracy:.4f}, {1000 * per_image_latency[stage]:.2f} ms/image")
+
+    best = calibrate_thresholds(probs, labels, per_image_latency, args.target_accuracy)
+    if best is None:
+        print(f"No threshold combination reaches accuracy {args.target_accuracy}")
+        return
+
+    print(f"Cascade accuracy {best['accuracy']:.4f} at {best['mean_latency_ms']:.2f} ms/image, exit rates {best['exit_rates']}")
+    output = args.output or thresholds_path(args.variant)
+    with open(output, 'w') as f:
+        json.dump(best, f, indent=2)
+    print(f"Cascade thresholds saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
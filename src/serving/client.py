@@ -0,0 +1,31 @@
+import io
+import json
+import urllib.request
+from typing import Dict, Union
+
+from PIL import Image
+
+
+def predict_remote(image: Union[Image.Image, bytes],
+                   model_type: str,
+                   server_url: str = 'http://127.0.0.1:8500',
+                   timeout: float = 60.0) -> Dict[str, float]:
+
+    if isinstance(image, Image.Image):
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        image = buffer.getvalue()
+
+    request = urllib.request.Request(
+        f"{server_url.rstrip('/')}/predict/{model_type}",
+        data=image,
+        headers={'Content-Type': 'application/octet-stream'},
+        method='POST'
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())['probabilities']
+
+
+def server_stats(server_url: str = 'http://127.0.0.1:8500', timeout: float = 5.0) -> dict:
+    with urllib.request.urlopen(f"{server_url.rstrip('/')}/stats", timeout=timeout) as response:
+        return json.loads(response.read())
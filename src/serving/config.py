@@ -0,0 +1,27 @@
+import os
+
+model_types = {
+    'resnet50v2': './saved/resnet50v2/fine_tuning/quantized_model.keras',
+    'vgg16': './saved/vgg16/fine_tuning/quantized_model.keras',
+    'mobilenetv2': './saved/mobilenetv2/fine_tuning/model.keras'
+}
+
+class_names = ["Glioma", "Meningioma", "Sehat", "Kanker Pituitari"]
+
+IMAGE_SIZE = (224, 224)
+
+model_variants = ['keras', 'shared', 'keras_int8', 'int8', 'dynamic', 'float16']
+
+def model_path(model_name: str, variant: str = 'keras') -> str:
+    if variant == 'keras':
+        return model_types[model_name]
+    if variant == 'shared':
+        from src.utils.shared_weights import artifact_path
+        return artifact_path(model_types[model_name])
+    if variant == 'keras_int8':
+        return f'./saved/{model_name}/fine_tuning/model_keras_int8.keras'
+    return f'./saved/{model_name}/fine_tuning/model_{variant}.tflite'
+
+def available_variants(model_names) -> list:
+    return [variant for variant in model_variants
+            if all(os.path.exists(model_path(name, variant)) for name in model_names)]
@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.serving.config import class_names as default_class_names, model_path, IMAGE_SIZE
+from src.serving.prediction_cache import model_version
+
+COMBINE_MODES = ('mean', 'weighted', 'calibrated')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(max_workers: Optional[int] = None) -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers or min(8, os.cpu_count() or 1),
+                                           thread_name_prefix='ensemble')
+        return _executor
+
+
+def apply_temperature(probs: np.ndarray, temperature: float) -> np.ndarray:
+    logits = np.log(np.clip(probs, 1e-7, 1.0)) / temperature
+    logits -= logits.max(axis=-1, keepdims=True)
+    scaled = np.exp(logits)
+    return scaled / scaled.sum(axis=-1, keepdims=True)
+
+
+class EnsemblePredictor:
+
+    def __init__(self,
+                 models: Dict[str, object],
+                 class_names: List[str] = default_class_names,
+                 weights: Optional[Dict[str, float]] = None,
+                 temperatures: Optional[Dict[str, float]] = None,
+                 img_size: Tuple[int, int] = IMAGE_SIZE):
+        self.models = models
+        self.class_names = class_names
+        self.weights = weights or {name: 1.0 for name in models}
+        self.temperatures = temperatures or {name: 1.0 for name in models}
+        self.img_size = img_size
+        self.last_latencies: Dict[str, float] = {}
+
+    def _run_model(self, name: str, images):
+        from src.data_preprocessing.basic_preprocessing import normalize_fn
+        from src.utils.model_utils import run_forward
+
+        start = time.perf_counter()
+        probs = run_forward(self.models[name], normalize_fn(images, name))
+        return probs, time.perf_counter() - start
+
+    def predict_probs(self, images) -> Dict[str, np.ndarray]:
+        from src.utils.model_utils import resize_images
+
+        start = time.perf_counter()
+        resized = resize_images(images, self.img_size)
+        futures = {name: get_executor().submit(self._run_model, name, resized) for name in self.models}
+
+        probs = {}
+        for name, future in futures.items():
+            probs[name], self.last_latencies[name] = future.result()
+        self.last_latencies['ensemble'] = time.perf_counter() - start
+        return probs
+
+    def combine(self, probs: Dict[str, np.ndarray], mode: str = 'mean') -> np.ndarray:
+        if mode == 'mean':
+            return np.mean([p for p in probs.values()], axis=0)
+        if mode == 'weighted':
+            total = sum(self.weights[name] for name in probs)
+            return sum(self.weights[name] * p for name, p in probs.items()) / total
+        if mode == 'calibrated':
+            total = sum(self.weights[name] for name in probs)
+            return sum(self.weights[name] * apply_temperature(p, self.temperatures[name])
+                       for name, p in probs.items()) / total
+        raise ValueError(f"Unknown combine mode: {mode}, expected one of {COMBINE_MODES}")
+
+    def _to_dicts(self, probs: np.ndarray) -> List[Dict[str, float]]:
+        return [{self.class_names[i]: float(p[i]) for i in range(len(self.class_names))} for p in probs]
+
+    def predict_batch(self, images, mode: str = 'mean') -> dict:
+        probs = self.predict_probs(images)
+        return {
+            'per_model': {name: self._to_dicts(p) for name, p in probs.items()},
+            'combined': self._to_dicts(self.combine(probs, mode)),
+        }
+
+    def predict(self, image, mode: str = 'mean') -> dict:
+        result = self.predict_batch([image], mode)
+        return {
+            'per_model': {name: dicts[0] for name, dicts in result['per_model'].items()},
+            'combined': result['combined'][0],
+        }
+
+    def calibrate(self, dataset, temperatures: Sequence[float] = np.linspace(0.5, 3.0, 26)) -> Dict[str, float]:
+        collected = {name: [] for name in self.models}
+        labels = []
+        for x_batch, y_batch in dataset:
+            for name, p in self.predict_probs(x_batch).items():
+                collected[name].append(p)
+            labels.append(np.argmax(y_batch.numpy(), axis=-1))
+        labels = np.concatenate(labels)
+
+        for name, chunks in collected.items():
+            probs = np.concatenate(chunks)
+            nll = lambda t: -np.mean(np.log(np.clip(apply_temperature(probs, t)[np.arange(len(labels)), labels], 1e-7, 1.0)))
+            self.temperatures[name] = float(min(temperatures, key=nll))
+            self.weights[name] = float(np.mean(np.argmax(probs, axis=-1) == labels))
+            print(f"{name}: temperature {self.temperatures[name]:.2f}, weight {self.weights[name]:.4f}")
+
+        return self.temperatures
+
+
+def calibration_path(variant: str = 'keras') -> str:
+    return f'./saved/ensemble_calibration_{variant}.json'
+
+
+def member_versions(names: Sequence[str], variant: str = 'keras') -> Dict[str, str]:
+    return {name: model_version(model_path(name, variant)) for name in names}
+
+
+def save_calibration(predictor: EnsemblePredictor, path: str, versions: Dict[str, str]):
+    with open(path, 'w') as f:
+        json.dump({'weights': predictor.weights, 'temperatures': predictor.temperatures, 'versions': versions}, f, indent=2)
+    print(f"Ensemble calibration saved to {path}")
+
+
+def load_calibration(path: str, versions: Dict[str, str]) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        calibration = json.load(f)
+    if calibration.get('versions') != versions:
+        print(f"Ignoring {path}, it was calibrated against other model files")
+        return None
+    return calibration
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit ensemble weights and temperatures on the validation split")
+    parser.add_argument('--train-dir', default='./data/raw/Training/')
+    parser.add_argument('--test-dir', default='./data/raw/Testing/')
+    parser.add_argument('--variant', default='keras')
+    parser.add_argument('--models', nargs='+', default=['vgg16', 'resnet50v2', 'mobilenetv2'])
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    from src.data_preprocessing.load_data import load_data
+    from src.utils.quantization import load_variant
+
+    _, validset, _ = load_data(args.train_dir, args.test_dir, img_size=IMAGE_SIZE,
+                               batch_size=args.batch_size, color_mode='rgb')
+    predictor = EnsemblePredictor({name: load_variant(model_path(name, args.variant)) for name in args.models})
+    predictor.calibrate(validset)
+    save_calibration(predictor, calibration_path(args.variant), member_versions(args.models, args.variant))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from src.serving.config import class_names, IMAGE_SIZE
+
+
+def current_rss_mb() -> float:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def model_size_mb(model, model_path: str, seen: Optional[set] = None) -> float:
+    if hasattr(model, 'weights'):
+        itemsize = lambda dtype: getattr(dtype, 'size', None) or np.dtype(dtype).itemsize
+        seen = set() if seen is None else seen
+        weights = [w for w in model.weights if id(w) not in seen]
+        seen.update(id(w) for w in weights)
+        return sum(int(np.prod(w.shape)) * itemsize(w.dtype) for w in weights) / (1024 * 1024)
+    return os.path.getsize(model_path) / (1024 * 1024)
+
+
+def default_loader(model_path: str):
+    from src.utils.quantization import load_variant
+    return load_variant(model_path)
+
+
+class ModelPool:
+
+    def __init__(self,
+                 memory_budget_mb: float = 2048,
+                 loader: Optional[Callable] = None,
+                 warmup: bool = True,
+                 img_size=IMAGE_SIZE):
+        self.memory_budget_mb = memory_budget_mb
+        self.loader = loader or default_loader
+        self.warmup = warmup
+        self.img_size = img_size
+
+        self._models = OrderedDict()
+        self._metrics: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._path_locks: Dict[str, threading.Lock] = {}
+
+    def _path_lock(self, model_path: str) -> threading.Lock:
+        with self._lock:
+            return self._path_locks.setdefault(model_path, threading.Lock())
+
+    def _used_mb(self, seen: Optional[set] = None) -> float:
+        seen = set() if seen is None else seen
+        return sum(model_size_mb(model, path, seen) for path, model in self._models.items())
+
+    def _marginal_mb(self, model, model_path: str) -> float:
+        seen = set()
+        self._used_mb(seen)
+        return model_size_mb(model, model_path, seen)
+
+    def _evict_for(self, model, model_path: str):
+        while self._models and self._used_mb() + self._marginal_mb(model, model_path) > self.memory_budget_mb:
+            path, _ = self._models.popitem(last=False)
+            self._metrics[path]['evictions'] += 1
+            self._metrics[path]['resident'] = False
+            print(f"Evicted {path} from model pool")
+
+    def _warmup(self, model, model_type: str) -> float:
+        from src.utils.model_utils import predict_batch
+
+        start = time.perf_counter()
+        predict_batch(model, np.zeros((1, *self.img_size, 3), dtype=np.float32), class_names,
+                      model_type=model_type, img_size=self.img_size)
+        return time.perf_counter() - start
+
+    def get(self, model_path: str, model_type: str = 'vgg16'):
+        with self._lock:
+            if model_path in self._models:
+                self._models.move_to_end(model_path)
+                self._metrics[model_path]['hits'] += 1
+                return self._models[model_path]
+
+        with self._path_lock(model_path):
+            with self._lock:
+                if model_path in self._models:
+                    self._metrics[model_path]['hits'] += 1
+                    return self._models[model_path]
+
+            rss_before = current_rss_mb()
+            start = time.perf_counter()
+            model = self.loader(model_path)
+            load_s = time.perf_counter() - start
+            warmup_s = self._warmup(model, model_type) if self.warmup else 0.0
+
+            size_mb = model_size_mb(model, model_path)
+            with self._lock:
+                self._evict_for(model, model_path)
+                shared_mb = size_mb - self._marginal_mb(model, model_path)
+                metrics = self._metrics.setdefault(model_path, {'hits': 0, 'loads': 0, 'evictions': 0})
+                metrics.update({
+                    'model_type': model_type,
+                    'load_s': load_s,
+                    'warmup_s': warmup_s,
+                    'size_mb': size_mb,
+                    'shared_mb': shared_mb,
+                    'rss_delta_mb': current_rss_mb() - rss_before,
+                    'resident': True,
+                })
+                metrics['loads'] += 1
+                self._models[model_path] = model
+
+            print(f"Loaded {model_path} in {load_s:.2f}s (warmup {warmup_s:.2f}s, {size_mb:.1f} MB)")
+            return model
+
+    def preload(self, model_path: str, model_type: str = 'vgg16', background: bool = True):
+        if not background:
+            return self.get(model_path, model_type)
+        thread = threading.Thread(target=self.get, args=(model_path, model_type),
+                                  name=f"preload-{model_type}", daemon=True)
+        thread.start()
+        return thread
+
+    def metrics(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                'memory_budget_mb': self.memory_budget_mb,
+                'used_mb': self._used_mb(),
+                'rss_mb': current_rss_mb(),
+                'models': {path: dict(metrics) for path, metrics in self._metrics.items()},
+            }
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+
+def model_version(model_path: str) -> str:
+    if not os.path.exists(model_path):
+        return ''
+    stat = os.stat(model_path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def _encode(value):
+    if isinstance(value, np.ndarray):
+        return {'__ndarray__': value.tolist(), 'dtype': value.dtype.str}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+
+def _decode(obj: dict):
+    if '__ndarray__' in obj:
+        return np.array(obj['__ndarray__'], dtype=obj['dtype'])
+    return obj
+
+
+class PredictionCache:
+
+    def __init__(self, max_entries: int = 1024, disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if disk_path:
+            disk_dir = os.path.dirname(disk_path)
+            if disk_dir: os.makedirs(disk_dir, exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, value BLOB)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(image, model_path: str, version: Optional[str] = None, preprocess_config: Optional[dict] = None) -> str:
+        array = np.ascontiguousarray(np.asarray(image))
+        digest = hashlib.blake2b(digest_size=32)
+        digest.update(f"{array.shape}|{array.dtype}|".encode('utf-8'))
+        digest.update(array.data)
+        digest.update(model_path.encode('utf-8'))
+        digest.update((version if version is not None else model_version(model_path)).encode('utf-8'))
+        digest.update(json.dumps(preprocess_config or {}, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _remember(self, key: str, value: Any):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM predictions WHERE key = ?", (key,)).fetchone()
+                value = None
+                if row is not None:
+                    try:
+                        value = json.loads(row[0], object_hook=_decode)
+                    except (TypeError, ValueError):
+                        self._db.execute("DELETE FROM predictions WHERE key = ?", (key,))
+                        self._db.commit()
+                if value is not None:
+                    self._remember(key, value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO predictions (key, value) VALUES (?, ?)",
+                                 (key, json.dumps(value, default=_encode)))
+                self._db.commit()
+
+    def get_or_compute(self, key: str, compute_fn: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = compute_fn()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._entries),
+                'max_entries': self.max_entries,
+            }
@@ -0,0 +1,207 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.data_preprocessing.image_io import load_image
+from src.serving.config import model_types, class_names, model_path, model_variants, IMAGE_SIZE
+from src.utils import instrumentation
+
+
+class MicroBatcher:
+
+    def __init__(self, model, model_type: str, class_names: List[str],
+                 max_batch_size: int = 16, max_wait_ms: float = 10.0,
+                 img_size=IMAGE_SIZE):
+        self.model = model
+        self.model_type = model_type
+        self.class_names = class_names
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.img_size = img_size
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._requests = 0
+        self._inference_time = 0.0
+
+        self._worker = threading.Thread(target=self._run, name=f"batcher-{model_type}", daemon=True)
+        self._worker.start()
+
+    def submit(self, image: np.ndarray) -> Future:
+        future = Future()
+        self._queue.put((image, future))
+        return future
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0: break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        from src.utils.model_utils import predict_batch
+
+        while True:
+            batch = self._collect_batch()
+            images = [image for image, _ in batch]
+            futures = [future for _, future in batch]
+
+            start = time.perf_counter()
+            try:
+                results = predict_batch(self.model, images, self.class_names,
+                                        model_type=self.model_type,
+                                        img_size=self.img_size,
+                                        batch_size=self.max_batch_size)
+            except Exception as e:
+                for future in futures: future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self._batch_sizes[len(batch)] += 1
+                self._requests += len(batch)
+                self._inference_time += elapsed
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            num_batches = sum(self._batch_sizes.values())
+            return {
+                'queue_depth': self._queue.qsize(),
+                'requests': self._requests,
+                'batches': num_batches,
+                'mean_batch_size': self._requests / num_batches if num_batches else 0.0,
+                'batch_size_histogram': {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                'mean_batch_latency_ms': 1000 * self._inference_time / num_batches if num_batches else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+            }
+
+
+def decode_image(data: bytes, img_size=IMAGE_SIZE) -> np.ndarray:
+    return np.asarray(load_image(data, img_size))
+
+
+def make_handler(batchers: Dict[str, MicroBatcher], request_timeout: float = 60.0):
+
+    class InferenceHandler(BaseHTTPRequestHandler):
+
+        def _send_json(self, payload: dict, status: int = 200):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send_json({'status': 'ok', 'models': list(batchers)})
+            elif self.path == '/stats':
+                self._send_json({name: batcher.stats() for name, batcher in batchers.items()})
+            elif self.path == '/metrics':
+                body = instrumentation.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self._send_json({'error': f'Unknown path {self.path}'}, status=404)
+
+        def do_POST(self):
+            parts = self.path.strip('/').split('/')
+            if len(parts) != 2 or parts[0] != 'predict':
+                self._send_json({'error': f'Unknown path {self.path}'}, status=404)
+                return
+
+            model_type = parts[1]
+            if model_type not in batchers:
+                self._send_json({'error': f'Unknown model type {model_type}'}, status=404)
+                return
+
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                with instrumentation.span('server.decode'):
+                    image = decode_image(self.rfile.read(length))
+            except Exception as e:
+                self._send_json({'error': f'Invalid image: {e}'}, status=400)
+                return
+
+            try:
+                probs = batchers[model_type].submit(image).result(timeout=request_timeout)
+            except Exception as e:
+                self._send_json({'error': str(e)}, status=500)
+                return
+
+            self._send_json({'model_type': model_type, 'probabilities': probs})
+
+        def log_message(self, format, *args):
+            pass
+
+    return InferenceHandler
+
+
+def create_server(host: str = '127.0.0.1',
+                  port: int = 8500,
+                  models: Optional[List[str]] = None,
+                  max_batch_size: int = 16,
+                  max_wait_ms: float = 10.0,
+                  variant: str = 'keras') -> ThreadingHTTPServer:
+    from src.utils.quantization import load_variant
+
+    batchers = {}
+    for model_type in models or list(model_types):
+        print(f"Loading {model_type} from {model_path(model_type, variant)}")
+        model = load_variant(model_path(model_type, variant))
+        batchers[model_type] = MicroBatcher(model, model_type, class_names,
+                                            max_batch_size=max_batch_size,
+                                            max_wait_ms=max_wait_ms)
+
+    server = ThreadingHTTPServer((host, port), make_handler(batchers))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local brain tumor inference server with dynamic micro-batching")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8500)
+    parser.add_argument('--models', nargs='+', choices=list(model_types), default=None)
+    parser.add_argument('--max-batch-size', type=int, default=16)
+    parser.add_argument('--max-wait-ms', type=float, default=10.0)
+    parser.add_argument('--variant', choices=model_variants, default='keras')
+    parser.add_argument('--instrument', action='store_true', help="Record per-stage timings for GET /metrics")
+    args = parser.parse_args()
+
+    if args.instrument: instrumentation.enable()
+    server = create_server(args.host, args.port, args.models, args.max_batch_size, args.max_wait_ms, args.variant)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
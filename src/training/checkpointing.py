@@ -0,0 +1,199 @@
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import keras
+import numpy as np
+
+CHECKPOINT_PATTERN = re.compile(r'^ckpt-(\d+)-(\d+)$')
+CALLBACK_STATE = {
+    'early_stopping': ('wait', 'stopped_epoch', 'best', 'best_epoch'),
+    'reduce_lr': ('wait', 'cooldown_counter', 'best'),
+}
+
+
+def list_checkpoints(directory: str) -> List[str]:
+    if not os.path.isdir(directory):
+        return []
+    names = [name for name in os.listdir(directory) if CHECKPOINT_PATTERN.match(name)]
+    return [os.path.join(directory, name) for name in sorted(names)]
+
+
+def latest_checkpoint(directory: str) -> Optional[str]:
+    checkpoints = list_checkpoints(directory)
+    return checkpoints[-1] if checkpoints else None
+
+
+def _write_checkpoint(directory: str, name: str, arrays: Dict[str, np.ndarray], state: dict, max_to_keep: int) -> float:
+    start = time.perf_counter()
+    tmp_dir = os.path.join(directory, f'.tmp-{name}')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    with open(os.path.join(tmp_dir, 'arrays.npz'), 'wb') as f:
+        np.savez(f, **arrays)
+    with open(os.path.join(tmp_dir, 'state.json'), 'w') as f:
+        json.dump(state, f)
+
+    target_dir = os.path.join(directory, name)
+    shutil.rmtree(target_dir, ignore_errors=True)
+    os.rename(tmp_dir, target_dir)
+
+    for old_dir in list_checkpoints(directory)[:-max_to_keep]:
+        shutil.rmtree(old_dir, ignore_errors=True)
+    return time.perf_counter() - start
+
+
+class AsyncCheckpointer(keras.callbacks.Callback):
+
+    def __init__(self,
+                 directory: str,
+                 save_every_epochs: Optional[int] = 1,
+                 save_every_steps: Optional[int] = None,
+                 max_to_keep: int = 3,
+                 background: bool = True):
+        super().__init__()
+        self.directory = directory
+        self.save_every_epochs = save_every_epochs
+        self.save_every_steps = save_every_steps
+        self.max_to_keep = max_to_keep
+        self.background = background
+
+        self.history: Dict[str, list] = {}
+        self.tracked: Dict[str, keras.callbacks.Callback] = {}
+        self._pending_callback_state: Dict[str, dict] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoint') if background else None
+        self._pending: Optional[Future] = None
+
+        self._epoch = 0
+        self._step_in_epoch = 0
+        self.resume_step = 0
+        self._global_step = 0
+        self._train_start = None
+        self.stats = {'checkpoints': 0, 'blocking_s': 0.0, 'write_s': 0.0, 'train_s': 0.0}
+
+    def restore(self, model: keras.Model, **callbacks) -> int:
+        self.tracked = {name: callback for name, callback in callbacks.items() if name in CALLBACK_STATE}
+        path = latest_checkpoint(self.directory)
+        if path is None:
+            return 0
+
+        with open(os.path.join(path, 'state.json')) as f:
+            state = json.load(f)
+        with np.load(os.path.join(path, 'arrays.npz')) as arrays:
+            model.set_weights([arrays[f'weight_{i}'] for i in range(state['num_weights'])])
+
+            optimizer = model.optimizer
+            if not optimizer.built: optimizer.build(model.trainable_variables)
+            if len(optimizer.variables) != state['num_optimizer_variables']:
+                raise ValueError(f"Checkpoint {path} has {state['num_optimizer_variables']} optimizer variables, "
+                                 f"the model has {len(optimizer.variables)}")
+            for i, variable in enumerate(optimizer.variables):
+                variable.assign(arrays[f'optimizer_{i}'])
+            optimizer.learning_rate = state['learning_rate']
+
+            if state.get('early_stopping_best_weights'):
+                state['callbacks'].setdefault('early_stopping', {})['best_weights'] = [
+                    arrays[f'early_stopping_best_{i}'] for i in range(state['num_weights'])
+                ]
+
+        self.history = state['history']
+        self._epoch = state['epoch']
+        self._global_step = state['global_step']
+        self.resume_step = state['step_in_epoch']
+        self._pending_callback_state = state['callbacks']
+        print(f"Resuming from {path} at epoch {self._epoch}, step {self.resume_step} of the epoch "
+              f"({self._global_step} overall)")
+        return self._epoch
+
+    def _callback_state(self) -> Dict[str, dict]:
+        callback_state = {}
+        for name, callback in self.tracked.items():
+            values = {attr: getattr(callback, attr, None) for attr in CALLBACK_STATE[name]}
+            callback_state[name] = {attr: value.item() if isinstance(value, np.generic) else value
+                                    for attr, value in values.items() if isinstance(value, (int, float, np.generic))}
+        return callback_state
+
+    def _snapshot(self, epoch: int, step_in_epoch: int):
+        start = time.perf_counter()
+        if self._pending is not None:
+            self.stats['write_s'] += self._pending.result()
+
+        weights = self.model.get_weights()
+        arrays = {f'weight_{i}': w for i, w in enumerate(weights)}
+        optimizer_variables = self.model.optimizer.variables
+        for i, variable in enumerate(optimizer_variables):
+            arrays[f'optimizer_{i}'] = keras.ops.convert_to_numpy(variable)
+
+        callback_state = self._callback_state()
+        early_stopping = self.tracked.get('early_stopping')
+        best_weights = getattr(early_stopping, 'best_weights', None)
+        if best_weights is not None:
+            arrays.update({f'early_stopping_best_{i}': np.array(w) for i, w in enumerate(best_weights)})
+
+        state = {
+            'epoch': epoch,
+            'step_in_epoch': step_in_epoch,
+            'global_step': self._global_step,
+            'num_weights': len(weights),
+            'num_optimizer_variables': len(optimizer_variables),
+            'learning_rate': float(keras.ops.convert_to_numpy(self.model.optimizer.learning_rate)),
+            'early_stopping_best_weights': best_weights is not None,
+            'callbacks': callback_state,
+            'history': {key: list(values) for key, values in self.history.items()},
+        }
+
+        name = f'ckpt-{epoch:04d}-{self._global_step:08d}'
+        if self._executor is not None:
+            self._pending = self._executor.submit(_write_checkpoint, self.directory, name, arrays, state, self.max_to_keep)
+        else:
+            self.stats['write_s'] += _write_checkpoint(self.directory, name, arrays, state, self.max_to_keep)
+        self.stats['checkpoints'] += 1
+        self.stats['blocking_s'] += time.perf_counter() - start
+
+    def flush(self):
+        if self._pending is not None:
+            self.stats['write_s'] += self._pending.result()
+            self._pending = None
+
+    def on_train_begin(self, logs=None):
+        os.makedirs(self.directory, exist_ok=True)
+        for name, attributes in self._pending_callback_state.items():
+            if name in self.tracked:
+                for attr, value in attributes.items():
+                    setattr(self.tracked[name], attr, value)
+        self._pending_callback_state = {}
+        self._train_start = time.perf_counter()
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch = epoch
+        self._step_in_epoch = self.resume_step
+        self.resume_step = 0
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._global_step += 1
+        self._step_in_epoch += 1
+        if self.save_every_steps and self._global_step % self.save_every_steps == 0:
+            self._snapshot(self._epoch, self._step_in_epoch)
+
+    def on_epoch_end(self, epoch, logs=None):
+        for key, value in (logs or {}).items():
+            self.history.setdefault(key, []).append(float(value))
+        if self.save_every_epochs and (epoch + 1) % self.save_every_epochs == 0:
+            self._snapshot(epoch + 1, 0)
+
+    def on_train_end(self, logs=None):
+        self._pending_callback_state = self._callback_state()
+        early_stopping = self.tracked.get('early_stopping')
+        if getattr(early_stopping, 'best_weights', None) is not None:
+            self._pending_callback_state['early_stopping']['best_weights'] = early_stopping.best_weights
+        self.flush()
+        self.stats['train_s'] += time.perf_counter() - self._train_start
+
+    def overhead(self) -> dict:
+        train_s = self.stats['train_s']
+        return {**self.stats, 'blocking_fraction': self.stats['blocking_s'] / train_s if train_s else 0.0}
@@ -0,0 +1,235 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import keras
+import numpy as np
+import tensorflow as tf
+from tensorflow.data import Dataset
+
+from src.data_preprocessing.basic_preprocessing import normalize_fn
+from src.data_preprocessing.materialize import files_fingerprint, list_class_files
+from src.modeling.modeling import create_mobilenetv2_model, create_head_classifier
+from src.serving.prediction_cache import model_version
+from src.training.training import train_model
+
+SOFT_LABEL_FORMAT_VERSION = 1
+DEFAULT_TEACHERS = ('vgg16', 'resnet50v2')
+
+
+def teacher_path(teacher: str, saved_dir: str = './saved') -> str:
+    return os.path.join(saved_dir, teacher, 'fine_tuning', 'model.keras')
+
+
+def image_dataset(paths: Sequence[str], img_size: Tuple[int, int] = (224, 224)) -> Dataset:
+    def load_fn(path):
+        image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+        return tf.image.resize(image, img_size)
+
+    return Dataset.from_tensor_slices(list(paths)).map(load_fn, num_parallel_calls=tf.data.AUTOTUNE)
+
+
+def load_soft_labels(path: str, fingerprint: Optional[str] = None) -> Optional[np.ndarray]:
+    meta_path = os.path.join(path, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get('version') != SOFT_LABEL_FORMAT_VERSION or (fingerprint and meta.get('fingerprint') != fingerprint):
+        return None
+    return np.load(os.path.join(path, 'log_probs.npy'), mmap_mode='r')
+
+
+def cache_soft_labels(paths: List[str],
+                      teacher: str,
+                      model_path: str,
+                      cache_dir: str = './data/processed/soft_labels',
+                      img_size: Tuple[int, int] = (224, 224),
+                      batch_size: int = 32,
+                      force: bool = False) -> np.ndarray:
+    from src.utils.model_utils import run_forward
+    from src.utils.quantization import load_variant
+
+    fingerprint = hashlib.sha256(
+        f"{files_fingerprint(paths)}|{model_path}|{model_version(model_path)}|{img_size}".encode('utf-8')
+    ).hexdigest()
+    path = os.path.join(cache_dir, f"{teacher}_{img_size[0]}x{img_size[1]}")
+    cached = None if force else load_soft_labels(path, fingerprint)
+    if cached is not None:
+        print(f"Using cached {teacher} soft labels from {path}")
+        return cached
+
+    print(f"Computing {teacher} soft labels for {len(paths)} images into {path}")
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, 'meta.json')
+    if os.path.exists(meta_path): os.remove(meta_path)
+
+    model = load_variant(model_path)
+    log_probs = None
+    offset = 0
+    for images in image_dataset(paths, img_size).batch(batch_size).prefetch(tf.data.AUTOTUNE):
+        probs = run_forward(model, normalize_fn(images, teacher), batch_size=batch_size)
+        if log_probs is None:
+            log_probs = np.lib.format.open_memmap(os.path.join(path, 'log_probs.npy'), mode='w+',
+                                                  dtype=np.float32, shape=(len(paths), probs.shape[-1]))
+        log_probs[offset:offset + len(probs)] = np.log(np.clip(probs, 1e-7, 1.0))
+        offset += len(probs)
+
+    log_probs.flush()
+    del log_probs
+
+    with open(meta_path, 'w') as f:
+        json.dump({'version': SOFT_LABEL_FORMAT_VERSION, 'fingerprint': fingerprint, 'teacher': teacher,
+                   'model_path': model_path, 'img_size': list(img_size), 'num_samples': offset}, f)
+    return load_soft_labels(path, fingerprint)
+
+
+def combine_teachers(teacher_log_probs: List[np.ndarray]) -> np.ndarray:
+    probs = np.mean([np.exp(log_probs) for log_probs in teacher_log_probs], axis=0)
+    return np.log(np.clip(probs, 1e-7, 1.0)).astype(np.float32)
+
+
+def distillation_loss(num_classes: int, temperature: float = 4.0, alpha: float = 0.3):
+
+    def kd_loss(y_true, y_pred):
+        hard_labels, teacher_log_probs = y_true[:, :num_classes], y_true[:, num_classes:]
+        student_log_probs = tf.math.log(tf.clip_by_value(tf.cast(y_pred, tf.float32), 1e-7, 1.0))
+
+        soft_teacher = tf.nn.softmax(teacher_log_probs / temperature)
+        soft_student = tf.nn.log_softmax(student_log_probs / temperature)
+        kd = tf.reduce_sum(soft_teacher * (tf.math.log(soft_teacher + 1e-7) - soft_student), axis=-1)
+        ce = -tf.reduce_sum(hard_labels * student_log_probs, axis=-1)
+        return alpha * ce + (1 - alpha) * temperature ** 2 * kd
+
+    return kd_loss
+
+
+def packed_accuracy(num_classes: int):
+
+    def accuracy(y_true, y_pred):
+        return tf.cast(tf.equal(tf.argmax(y_true[:, :num_classes], axis=-1), tf.argmax(y_pred, axis=-1)), tf.float32)
+
+    return accuracy
+
+
+def distillation_datasets(paths: List[str],
+                          labels: List[int],
+                          teacher_log_probs: np.ndarray,
+                          num_classes: int,
+                          img_size: Tuple[int, int] = (224, 224),
+                          batch_size: int = 32,
+                          validation_split: float = 0.2,
+                          seed: int = 42) -> Tuple[Dataset, Dataset]:
+
+    targets = np.concatenate([np.eye(num_classes, dtype=np.float32)[labels], teacher_log_probs], axis=-1)
+    split_keys = np.random.default_rng(seed).permutation(len(paths)) / max(len(paths), 1)
+    paths = np.array(paths)
+
+    def build(mask, shuffle):
+        def load_fn(path, target):
+            image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+            return normalize_fn(tf.image.resize(image, img_size), 'mobilenetv2'), target
+
+        dataset = Dataset.from_tensor_slices((paths[mask], targets[mask]))
+        if shuffle: dataset = dataset.shuffle(int(mask.sum()), seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.map(load_fn, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+        return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+    in_validation = split_keys < validation_split
+    return build(~in_validation, shuffle=True), build(in_validation, shuffle=False)
+
+
+def measure_latency(model, model_type: str, images: tf.Tensor, num_runs: int = 20) -> float:
+    from src.utils.model_utils import run_forward
+
+    inputs = normalize_fn(images, model_type)
+    for _ in range(3): run_forward(model, inputs)
+    start = time.perf_counter()
+    for _ in range(num_runs): run_forward(model, inputs)
+    return 1000 * (time.perf_counter() - start) / (num_runs * int(images.shape[0]))
+
+
+def distill(train_dir: str,
+            test_dir: str,
+            teachers: Sequence[str] = DEFAULT_TEACHERS,
+            saved_dir: str = './saved',
+            cache_dir: str = './data/processed/soft_labels',
+            img_size: Tuple[int, int] = (224, 224),
+            temperature: float = 4.0,
+            alpha: float = 0.3,
+            epochs: int = 10,
+            batch_size: int = 32,
+            validation_split: float = 0.2,
+            seed: int = 42,
+            checkpointer=None) -> Tuple[dict, keras.Model, Dict[str, dict]]:
+    from src.data_preprocessing.load_data import load_data
+    from src.evaluation.evaluation import evaluate_models
+    from src.training.save_model import save_model_and_history
+    from src.training.training import plot_training_history
+    from src.utils.quantization import load_variant
+
+    paths, labels, class_names = list_class_files(train_dir)
+    num_classes = len(class_names)
+    teacher_log_probs = combine_teachers([
+        cache_soft_labels(paths, teacher, teacher_path(teacher, saved_dir), cache_dir, img_size, batch_size)
+        for teacher in teachers
+    ])
+    trainset, validset = distillation_datasets(paths, labels, teacher_log_probs, num_classes, img_size,
+                                               batch_size, validation_split, seed)
+
+    student = create_mobilenetv2_model(input_shape=(*img_size, 3), fine_tune=True,
+                                       head_classifier=create_head_classifier, num_classes=num_classes)
+    student.compile(optimizer='adam', loss=distillation_loss(num_classes, temperature, alpha),
+                    metrics=[packed_accuracy(num_classes)])
+    history, student = train_model(student, trainset, validset, batch_size=batch_size, epochs=epochs,
+                                   checkpointer=checkpointer)
+
+    student.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    output_dir = os.path.join(saved_dir, 'mobilenetv2', 'distilled')
+    plot_training_history(history, model_name='mobilenetv2 (distilled)', save_path=os.path.join(output_dir, 'plot.png'))
+    save_model_and_history(student, history,
+                           model_filename=os.path.join(output_dir, 'model.keras'),
+                           history_filename=os.path.join(output_dir, 'history.json'))
+
+    _, _, testset = load_data(train_dir, test_dir, img_size=img_size, batch_size=batch_size, color_mode='rgb')
+    models = {'student': student, **{teacher: load_variant(teacher_path(teacher, saved_dir)) for teacher in teachers}}
+    model_types = {'student': 'mobilenetv2', **{teacher: teacher for teacher in teachers}}
+    baseline_path = teacher_path('mobilenetv2', saved_dir)
+    if os.path.exists(baseline_path):
+        models['mobilenetv2'] = load_variant(baseline_path)
+        model_types['mobilenetv2'] = 'mobilenetv2'
+
+    evaluations = evaluate_models(models, testset, class_names, model_types)
+    sample = next(iter(testset))[0]
+    report = {}
+    for name, model in models.items():
+        report[name] = {'accuracy': float(evaluations[name]['accuracy']),
+                        'latency_ms_per_image': measure_latency(model, model_types[name], sample)}
+        print(f"{name:>12}: accuracy {report[name]['accuracy']:.4f}, {report[name]['latency_ms_per_image']:.2f} ms/image")
+
+    with open(os.path.join(output_dir, 'report.json'), 'w') as f:
+        json.dump({'teachers': list(teachers), 'temperature': temperature, 'alpha': alpha, 'models': report}, f, indent=2)
+    return history, student, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill fine-tuned VGG16/ResNet50 teachers into a MobileNetV2 student")
+    parser.add_argument('--train-dir', default='./data/raw/Training/')
+    parser.add_argument('--test-dir', default='./data/raw/Testing/')
+    parser.add_argument('--teachers', nargs='+', default=list(DEFAULT_TEACHERS), choices=['vgg16', 'resnet50v2'])
+    parser.add_argument('--temperature', type=float, default=4.0)
+    parser.add_argument('--alpha', type=float, default=0.3, help="Weight of the hard-label loss")
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    distill(args.train_dir, args.test_dir, teachers=args.teachers, temperature=args.temperature,
+            alpha=args.alpha, epochs=args.epochs, batch_size=args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
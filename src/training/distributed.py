@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+STRATEGIES = ('auto', 'multi_worker', 'mirrored', 'default')
+
+
+def free_ports(count: int, host: str = 'localhost') -> List[int]:
+    sockets = [socket.socket() for _ in range(count)]
+    for sock in sockets: sock.bind((host, 0))
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets: sock.close()
+    return ports
+
+
+def cluster_spec(num_workers: int, host: str = 'localhost') -> Dict[str, List[str]]:
+    return {'worker': [f'{host}:{port}' for port in free_ports(num_workers, host)]}
+
+
+def task_info() -> dict:
+    tf_config = json.loads(os.environ.get('TF_CONFIG', '{}'))
+    cluster = tf_config.get('cluster', {})
+    task = tf_config.get('task', {'type': 'worker', 'index': 0})
+    return {
+        'type': task['type'],
+        'index': task['index'],
+        'num_workers': len(cluster.get('worker', [])) + len(cluster.get('chief', [])) or 1,
+        'is_chief': task['type'] == 'chief' or (task['type'] == 'worker' and task['index'] == 0 and 'chief' not in cluster),
+    }
+
+
+def create_strategy(kind: str = 'auto'):
+    import tensorflow as tf
+
+    if kind == 'auto':
+        if 'TF_CONFIG' in os.environ:
+            kind = 'multi_worker'
+        elif len(tf.config.list_physical_devices('GPU')) > 1:
+            kind = 'mirrored'
+        else:
+            kind = 'default'
+
+    if kind == 'multi_worker':
+        return tf.distribute.MultiWorkerMirroredStrategy()
+    if kind == 'mirrored':
+        return tf.distribute.MirroredStrategy()
+    if kind == 'default':
+        return tf.distribute.get_strategy()
+    raise ValueError(f"Unknown strategy: {kind}, expected one of {STRATEGIES}")
+
+
+def run_worker(model_type: str,
+               train_dir: str,
+               test_dir: str,
+               batch_size: int = 32,
+               epochs: int = 2,
+               steps_per_epoch: Optional[int] = None,
+               fine_tune: bool = False,
+               threads: Optional[int] = None,
+               strategy_kind: str = 'auto',
+               save_path: Optional[str] = None,
+               num_classes: int = 4) -> dict:
+    import keras
+    import tensorflow as tf
+    if threads:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(max(1, threads // 2))
+    strategy = create_strategy(strategy_kind)
+
+    from src.data_preprocessing.load_data import load_data
+    from src.data_preprocessing.basic_preprocessing import preprocess_data
+    from src.modeling.modeling import MODEL_FACTORIES, create_head_classifier
+    from src.training.training import train_model
+
+    trainset, validset, _ = load_data(train_dir, test_dir, batch_size=batch_size, color_mode='rgb')
+    trainset = preprocess_data(trainset, img_size=(224, 224), model_type=model_type)
+    validset = preprocess_data(validset, img_size=(224, 224), model_type=model_type)
+    if steps_per_epoch:
+        trainset = trainset.take(steps_per_epoch * strategy.num_replicas_in_sync)
+        validset = validset.take(max(1, steps_per_epoch // 4) * strategy.num_replicas_in_sync)
+
+    model = MODEL_FACTORIES[model_type](input_shape=(224, 224, 3), fine_tune=fine_tune,
+                                        head_classifier=create_head_classifier,
+                                        num_classes=num_classes, strategy=strategy)
+
+    epoch_times, epoch_steps = [], []
+
+    class EpochTimer(keras.callbacks.Callback):
+        def on_epoch_begin(self, epoch, logs=None):
+            self.start = time.perf_counter()
+            epoch_steps.append(0)
+
+        def on_train_batch_end(self, batch, logs=None):
+            epoch_steps[-1] += 1
+
+        def on_test_begin(self, logs=None):
+            if self.start is not None: epoch_times.append(time.perf_counter() - self.start)
+            self.start = None
+
+    history, model = train_model(model, trainset, validset, batch_size=batch_size, epochs=epochs,
+                                 extra_callbacks=[EpochTimer()], strategy=strategy)
+
+    task = task_info()
+    if save_path and task['is_chief']:
+        os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
+        model.save(save_path)
+    elif save_path:
+        scratch_dir = tempfile.mkdtemp()
+        model.save(os.path.join(scratch_dir, 'model.keras'))
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    timed = slice(1, None) if len(epoch_times) > 1 else slice(None)
+    global_batch_size = batch_size * strategy.num_replicas_in_sync
+    return {
+        'model_type': model_type,
+        'num_workers': task['num_workers'],
+        'num_replicas': strategy.num_replicas_in_sync,
+        'global_batch_size': global_batch_size,
+        'steps_per_epoch': epoch_steps,
+        'epoch_times_s': epoch_times,
+        'images_per_sec': sum(epoch_steps[timed]) * global_batch_size / sum(epoch_times[timed]),
+        'final_val_loss': float(history['val_loss'][-1]),
+        'final_val_accuracy': float(history['val_accuracy'][-1]),
+    }
+
+
+def launch_local(num_workers: int, worker_args: List[str], threads_per_worker: Optional[int] = None) -> dict:
+    spec = cluster_spec(num_workers)
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        result_path = os.path.join(tmp_dir, 'result.json')
+        processes = []
+        for index in range(num_workers):
+            env = {**os.environ,
+                   'TF_CONFIG': json.dumps({'cluster': spec, 'task': {'type': 'worker', 'index': index}}),
+                   'OMP_NUM_THREADS': str(threads)}
+            command = [sys.executable, '-m', 'src.training.distributed', '--worker',
+                       '--threads', str(threads), '--result', result_path, *worker_args]
+            processes.append(subprocess.Popen(command, env=env))
+
+        return_codes = [process.wait() for process in processes]
+        if any(return_codes):
+            raise RuntimeError(f"Worker processes failed with exit codes {return_codes}")
+
+        with open(result_path) as f:
+            return {**json.load(f), 'threads_per_worker': threads}
+
+
+def scaling_report(worker_counts: List[int], worker_args: List[str], threads_per_worker: Optional[int] = None) -> List[dict]:
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // max(worker_counts))
+
+    results = []
+    for num_workers in worker_counts:
+        print(f"Training with {num_workers} workers x {threads} threads")
+        results.append(launch_local(num_workers, worker_args, threads))
+
+    baseline = results[0]
+    for result in results:
+        result['speedup'] = result['images_per_sec'] / baseline['images_per_sec']
+        result['scaling_efficiency'] = result['speedup'] * baseline['num_workers'] / result['num_workers']
+        print(f"{result['num_workers']:>3} workers: {result['images_per_sec']:.1f} images/sec, "
+              f"speedup x{result['speedup']:.2f}, efficiency {100 * result['scaling_efficiency']:.0f}%")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Data-parallel training over a TF_CONFIG cluster of worker processes")
+    parser.add_argument('--model-type', default='mobilenetv2', choices=['vgg16', 'resnet50v2', 'mobilenetv2'])
+    parser.add_argument('--train-dir', default='./data/raw/Training/')
+    parser.add_argument('--test-dir', default='./data/raw/Testing/')
+    parser.add_argument('--batch-size', type=int, default=32, help="Per-worker batch size")
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--steps-per-epoch', type=int, default=None)
+    parser.add_argument('--fine-tune', action='store_true')
+    parser.add_argument('--strategy', default='auto', choices=STRATEGIES)
+    parser.add_argument('--save-path', default=None)
+    parser.add_argument('--num-workers', type=int, default=2)
+    parser.add_argument('--scale', type=int, nargs='+', default=None, help="Worker counts for a scaling-efficiency report")
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--output', default='scaling_report.json')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--result', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    worker_args = ['--model-type', args.model_type, '--train-dir', args.train_dir, '--test-dir', args.test_dir,
+                   '--batch-size', str(args.batch_size), '--epochs', str(args.epochs), '--strategy', 'multi_worker']
+    if args.steps_per_epoch: worker_args += ['--steps-per-epoch', str(args.steps_per_epoch)]
+    if args.fine_tune: worker_args.append('--fine-tune')
+
+    if args.worker:
+        result = run_worker(args.model_type, args.train_dir, args.test_dir, batch_size=args.batch_size,
+                            epochs=args.epochs, steps_per_epoch=args.steps_per_epoch, fine_tune=args.fine_tune,
+                            threads=args.threads, strategy_kind=args.strategy, save_path=args.save_path)
+        if args.result and task_info()['is_chief']:
+            with open(args.result, 'w') as f:
+                json.dump(result, f)
+        return
+
+    if args.scale:
+        results = scaling_report(args.scale, worker_args, args.threads)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Scaling report saved to {args.output}")
+        return
+
+    if args.save_path: worker_args += ['--save-path', args.save_path]
+    result = launch_local(args.num_workers, worker_args, args.threads)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
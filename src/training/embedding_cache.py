@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+from typing import Callable, List, Optional, Tuple
+
+import keras
+import numpy as np
+import tensorflow as tf
+from keras import layers, models
+from tensorflow.data import Dataset
+
+from src.data_preprocessing.basic_preprocessing import preprocess_data
+from src.data_preprocessing.materialize import files_fingerprint
+from src.modeling.modeling import create_backbone, create_head_classifier
+from src.training.training import train_model
+
+CACHE_FORMAT_VERSION = 1
+
+def dataset_fingerprint(dataset: Dataset) -> str:
+    return files_fingerprint(dataset.file_paths)
+
+def backbone_fingerprint(backbone: keras.Model) -> str:
+    digest = hashlib.sha256(keras.__version__.encode('utf-8'))
+    for weight in backbone.get_weights():
+        digest.update(np.ascontiguousarray(weight).tobytes())
+    return digest.hexdigest()
+
+def embedding_cache_dir(cache_dir: str, dataset_name: str, model_type: str, img_size: Tuple[int, int]) -> str:
+    return os.path.join(cache_dir, dataset_name, f"{model_type}_{img_size[0]}x{img_size[1]}")
+
+def load_embeddings(path: str, fingerprint: Optional[str] = None):
+    meta_path = os.path.join(path, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get('version') != CACHE_FORMAT_VERSION or (fingerprint and meta.get('fingerprint') != fingerprint):
+        return None
+
+    features = np.load(os.path.join(path, 'features.npy'), mmap_mode='r')
+    labels = np.load(os.path.join(path, 'labels.npy'), mmap_mode='r')
+    return features, labels, meta
+
+def cache_embeddings(dataset: Dataset,
+                     model_type: str,
+                     dataset_name: str,
+                     cache_dir: str = './data/processed/embeddings',
+                     img_size: Tuple[int, int] = (224, 224),
+                     backbone: Optional[keras.Model] = None,
+                     force: bool = False):
+
+    backbone = backbone or create_backbone(model_type, input_shape=(*img_size, 3))
+    fingerprint = hashlib.sha256(
+        f"{dataset_fingerprint(dataset)}|{backbone_fingerprint(backbone)}|{model_type}|{img_size}".encode('utf-8')
+    ).hexdigest()
+
+    path = embedding_cache_dir(cache_dir, dataset_name, model_type, img_size)
+    cached = None if force else load_embeddings(path, fingerprint)
+    if cached is not None:
+        print(f"Using cached embeddings from {path}")
+        return cached
+
+    print(f"Computing {model_type} embeddings for {dataset_name} into {path}")
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, 'meta.json')
+    if os.path.exists(meta_path): os.remove(meta_path)
+
+    pooled = layers.GlobalAveragePooling2D()(backbone.output)
+    extractor = models.Model(inputs=backbone.input, outputs=pooled)
+    extract = tf.function(lambda x: extractor(x, training=False))
+
+    num_samples = len(dataset.file_paths)
+    num_classes = dataset.element_spec[1].shape[-1]
+    features = np.lib.format.open_memmap(os.path.join(path, 'features.npy'), mode='w+',
+                                         dtype=np.float32, shape=(num_samples, pooled.shape[-1]))
+    labels = np.lib.format.open_memmap(os.path.join(path, 'labels.npy'), mode='w+',
+                                       dtype=np.float32, shape=(num_samples, num_classes))
+
+    offset = 0
+    for x, y in preprocess_data(dataset, img_size=img_size, model_type=model_type):
+        batch_features = extract(x).numpy()
+        features[offset:offset + len(batch_features)] = batch_features
+        labels[offset:offset + len(batch_features)] = y.numpy()
+        offset += len(batch_features)
+
+    features.flush()
+    labels.flush()
+    del features, labels
+
+    meta = {
+        'version': CACHE_FORMAT_VERSION,
+        'fingerprint': fingerprint,
+        'model_type': model_type,
+        'img_size': list(img_size),
+        'num_samples': offset,
+        'class_names': list(getattr(dataset, 'class_names', [])),
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+
+    return load_embeddings(path, fingerprint)
+
+def create_embedding_head_model(feature_dim: int,
+                                num_classes: int,
+                                head_classifier: Callable = create_head_classifier) -> keras.Model:
+    inputs = layers.Input(shape=(feature_dim,))
+    x = layers.Reshape((1, 1, feature_dim))(inputs)
+    outputs = head_classifier(x, num_classes)
+
+    model = models.Model(inputs=inputs, outputs=outputs)
+    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    return model
+
+def memmap_dataset(features: np.ndarray, labels: np.ndarray, batch_size: int, buffer_size: Optional[int] = None) -> Dataset:
+    def gather(indices):
+        indices = np.sort(indices)
+        return np.asarray(features[indices]), np.asarray(labels[indices])
+
+    def load_batch(indices):
+        x, y = tf.numpy_function(gather, [indices], [tf.as_dtype(features.dtype), tf.as_dtype(labels.dtype)])
+        return tf.ensure_shape(x, [None, *features.shape[1:]]), tf.ensure_shape(y, [None, *labels.shape[1:]])
+
+    dataset = Dataset.range(len(features))
+    if buffer_size: dataset = dataset.shuffle(buffer_size, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size).map(load_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+def train_head_on_embeddings(model_type: str,
+                             train_dataset: Dataset,
+                             val_dataset: Dataset,
+                             num_classes: int,
+                             cache_dir: str = './data/processed/embeddings',
+                             img_size: Tuple[int, int] = (224, 224),
+                             head_classifier: Callable = create_head_classifier,
+                             batch_size: int = 32,
+                             epochs: int = 10,
+                             buffer_size: int = 10000) -> Tuple[dict, keras.Model]:
+
+    backbone = create_backbone(model_type, input_shape=(*img_size, 3))
+    train_features, train_labels, _ = cache_embeddings(train_dataset, model_type, 'train', cache_dir, img_size, backbone)
+    val_features, val_labels, _ = cache_embeddings(val_dataset, model_type, 'validation', cache_dir, img_size, backbone)
+
+    train_cached = memmap_dataset(train_features, train_labels, batch_size, buffer_size=buffer_size)
+    val_cached = memmap_dataset(val_features, val_labels, batch_size)
+
+    head_model = create_embedding_head_model(train_features.shape[-1], num_classes, head_classifier)
+    history, head_model = train_model(head_model, train_cached, val_cached, batch_size=batch_size, epochs=epochs)
+    return history, head_model
+
+def _weighted_layers(layer) -> List:
+    if hasattr(layer, 'layers'):
+        return [leaf for sublayer in layer.layers for leaf in _weighted_layers(sublayer)]
+    return [layer] if layer.weights else []
+
+def attach_head(model: keras.Model, head_model: keras.Model) -> keras.Model:
+    head_layers = _weighted_layers(head_model)
+    model_layers = _weighted_layers(model)
+    by_name = {layer.name: layer for layer in model_layers}
+    if head_layers and all(layer.name in by_name for layer in head_layers):
+        targets = [by_name[layer.name] for layer in head_layers]
+    else:
+        targets = model_layers[-len(head_layers):] if 0 < len(head_layers) <= len(model_layers) else []
+
+    describe = lambda layers: [(type(layer).__name__, [tuple(w.shape) for w in layer.weights]) for layer in layers]
+    if not targets or describe(targets) != describe(head_layers):
+        raise ValueError(f"Head of {head_model.name} does not match the end of {model.name}: "
+                         f"{describe(head_layers)} vs {describe(targets)}")
+
+    for source, target in zip(head_layers, targets):
+        target.set_weights(source.get_weights())
+    return model
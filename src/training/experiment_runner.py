@@ -0,0 +1,234 @@
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+DEFAULT_CONFIG = {
+    'train_dir': './data/raw/Training/',
+    'test_dir': './data/raw/Testing/',
+    'save_base_dir': './saved',
+    'work_dir': './saved/experiments',
+    'img_size': [224, 224],
+    'batch_size': 32,
+    'num_classes': 4,
+    'min_epochs': 1,
+    'max_epochs': 10,
+    'eta': 3,
+    'halving_scope': 'global',
+    'max_workers': 3,
+    'threads_per_worker': 2,
+    'trials': [],
+    'grid': {
+        'model_type': ['vgg16', 'resnet50v2', 'mobilenetv2'],
+        'mode': ['feature_extractor', 'fine_tuning'],
+        'learning_rate': [0.001],
+        'head': ['default'],
+    },
+}
+
+
+TRIAL_CONFIG_KEYS = ('train_dir', 'img_size', 'batch_size', 'num_classes')
+
+
+def load_config(path: str) -> dict:
+    with open(path) as f:
+        user_config = json.load(f)
+    config = {**DEFAULT_CONFIG, **user_config}
+    if 'trials' in user_config and 'grid' not in user_config:
+        config['grid'] = {}
+    return config
+
+
+def expand_trials(config: dict) -> List[dict]:
+    trials = list(config.get('trials') or [])
+    grid = config.get('grid') or {}
+    if grid:
+        keys = list(grid)
+        for values in itertools.product(*(grid[key] for key in keys)):
+            trials.append(dict(zip(keys, values)))
+
+    for trial in trials:
+        trial.setdefault('learning_rate', 0.001)
+        trial.setdefault('head', 'default')
+        trial['trial_id'] = trial_id(trial, config)
+    return trials
+
+
+def trial_id(trial: dict, config: dict) -> str:
+    spec = {key: value for key, value in trial.items() if key != 'trial_id'}
+    spec.update({key: config[key] for key in TRIAL_CONFIG_KEYS})
+    digest = hashlib.sha256(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()[:10]
+    return f"{trial['model_type']}-{trial['mode']}-lr{trial['learning_rate']}-{trial['head']}-{digest}"
+
+
+def rung_budgets(min_epochs: int, max_epochs: int, eta: int) -> List[int]:
+    budgets = []
+    budget = min_epochs
+    while budget < max_epochs:
+        budgets.append(budget)
+        budget *= eta
+    budgets.append(max_epochs)
+    return budgets
+
+
+def _init_worker(threads: int):
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = str(max(1, threads // 2))
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(max(1, threads // 2))
+
+
+def _build_datasets(trial: dict, config: dict):
+    from src.data_preprocessing.load_data import load_data
+    from src.data_preprocessing.data_augmentation import augment_data
+    from src.data_preprocessing.basic_preprocessing import preprocess_data
+    from src.training.optimize_dataset import optimize_dataset
+
+    img_size = tuple(config['img_size'])
+    trainset, validset, _ = load_data(config['train_dir'], config['test_dir'], img_size=img_size,
+                                      batch_size=config['batch_size'], color_mode='rgb')
+    trainset = preprocess_data(augment_data(trainset), img_size=img_size, model_type=trial['model_type'])
+    validset = preprocess_data(validset, img_size=img_size, model_type=trial['model_type'])
+    return (optimize_dataset(trainset, prefetch=True),
+            optimize_dataset(validset, prefetch=True))
+
+
+def _build_model(trial: dict, config: dict):
+    import keras
+    from src.modeling.modeling import MODEL_FACTORIES, create_head_classifier, compile_model
+
+    model = MODEL_FACTORIES[trial['model_type']](input_shape=(*config['img_size'], 3),
+                                                 fine_tune=trial['mode'] == 'fine_tuning',
+                                                 head_classifier=create_head_classifier if trial['head'] == 'default' else None,
+                                                 num_classes=config['num_classes'])
+    return compile_model(model, optimizer=keras.optimizers.Adam(learning_rate=trial['learning_rate']))
+
+
+def run_trial(trial: dict, config: dict, epochs: int) -> dict:
+    import keras
+    from src.training.training import train_model
+
+    trial_dir = os.path.join(config['work_dir'], trial['trial_id'])
+    checkpoint_path = os.path.join(trial_dir, 'checkpoint.keras')
+    history_path = os.path.join(trial_dir, 'history.json')
+    state_path = os.path.join(trial_dir, 'state.json')
+    os.makedirs(trial_dir, exist_ok=True)
+
+    history, state = {}, {}
+    if os.path.exists(checkpoint_path):
+        with open(history_path) as f:
+            history = json.load(f)
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+
+    done_epochs = len(history.get('val_loss', []))
+    start = time.perf_counter()
+    if epochs > done_epochs and not state.get('converged'):
+        model = keras.models.load_model(checkpoint_path) if history else _build_model(trial, config)
+        trainset, validset = _build_datasets(trial, config)
+        new_history, model = train_model(model, trainset, validset,
+                                         batch_size=config['batch_size'],
+                                         epochs=epochs - done_epochs)
+        for key, values in new_history.items():
+            history.setdefault(key, []).extend(float(v) for v in values)
+        state['converged'] = len(new_history.get('val_loss', [])) < epochs - done_epochs
+
+        model.save(checkpoint_path)
+        with open(history_path, 'w') as f:
+            json.dump(history, f)
+        with open(state_path, 'w') as f:
+            json.dump(state, f)
+
+    return {
+        'trial_id': trial['trial_id'],
+        'epochs': len(history.get('val_loss', [])),
+        'val_loss': min(history['val_loss']),
+        'converged': bool(state.get('converged')),
+        'train_s': time.perf_counter() - start,
+    }
+
+
+def successive_halving(trials: List[dict], config: dict) -> Tuple[Dict[str, dict], Dict[str, dict]]:
+    budgets = rung_budgets(config['min_epochs'], config['max_epochs'], config['eta'])
+    per_group = config.get('halving_scope', 'global') == 'group'
+    groups = {}
+    for trial in trials:
+        groups.setdefault((trial['model_type'], trial['mode']) if per_group else 'all', []).append(trial)
+
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=config['max_workers'], mp_context=context,
+                             initializer=_init_worker, initargs=(config['threads_per_worker'],)) as executor:
+        for rung, budget in enumerate(budgets):
+            survivors = [trial for group in groups.values() for trial in group]
+            print(f"Rung {rung}: training {len(survivors)} trials to {budget} epochs")
+
+            futures = {trial['trial_id']: executor.submit(run_trial, trial, config, budget) for trial in survivors}
+            for trial_id, future in futures.items():
+                results[trial_id] = {**results.get(trial_id, {}), **future.result(), 'rung': rung}
+                carried = ' (converged, carried forward)' if results[trial_id]['converged'] else ''
+                print(f"  {trial_id}: val_loss {results[trial_id]['val_loss']:.4f}{carried}")
+
+            if rung == len(budgets) - 1: break
+            for key, group in groups.items():
+                keep = max(1, math.ceil(len(group) / config['eta']))
+                groups[key] = sorted(group, key=lambda t: results[t['trial_id']]['val_loss'])[:keep]
+
+    best = {}
+    finalists = [trial for group in groups.values() for trial in group]
+    for trial in sorted(finalists, key=lambda t: results[t['trial_id']]['val_loss']):
+        best.setdefault(f"{trial['model_type']}/{trial['mode']}", {**trial, **results[trial['trial_id']]})
+    return best, results
+
+
+def export_best(best: Dict[str, dict], config: dict):
+    import keras
+    from src.training.save_model import save_model_and_history
+    from src.training.training import plot_training_history
+
+    for name, trial in best.items():
+        trial_dir = os.path.join(config['work_dir'], trial['trial_id'])
+        output_dir = os.path.join(config['save_base_dir'], trial['model_type'], trial['mode'])
+
+        model = keras.models.load_model(os.path.join(trial_dir, 'checkpoint.keras'))
+        with open(os.path.join(trial_dir, 'history.json')) as f:
+            history = json.load(f)
+
+        plot_training_history(history, model_name=trial['model_type'], save_path=os.path.join(output_dir, 'plot.png'))
+        save_model_and_history(model, history,
+                               model_filename=os.path.join(output_dir, 'model.keras'),
+                               history_filename=os.path.join(output_dir, 'history.json'))
+        with open(os.path.join(output_dir, 'trial.json'), 'w') as f:
+            json.dump(trial, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a training sweep with successive-halving early termination")
+    parser.add_argument('config', help="JSON experiment config")
+    parser.add_argument('--no-export', action='store_true', help="Keep results in work_dir only")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    trials = expand_trials(config)
+    print(f"Running {len(trials)} trials with {config['max_workers']} workers x {config['threads_per_worker']} threads")
+
+    start = time.perf_counter()
+    best, results = successive_halving(trials, config)
+    print(f"Sweep finished in {time.perf_counter() - start:.0f}s, exporting {', '.join(best) or 'nothing'}")
+
+    with open(os.path.join(config['work_dir'], 'results.json'), 'w') as f:
+        json.dump({'best': best, 'trials': results}, f, indent=2)
+    if not args.no_export: export_best(best, config)
+
+
+if __name__ == '__main__':
+    main()
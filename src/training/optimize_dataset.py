@@ -1,19 +1,79 @@
+import time
 import tensorflow as tf
-from typing import Optional
+from typing import Optional, Tuple
+from src.data_preprocessing.basic_preprocessing import normalize_fn
+from src.data_preprocessing.data_augmentation import create_augmentation
+
+def is_batched(dataset: tf.data.Dataset) -> bool:
+    image_spec = tf.nest.flatten(dataset.element_spec)[0]
+    return image_spec.shape.rank is not None and image_spec.shape.rank == 4
 
 def optimize_dataset(
-    dataset: tf.data.Dataset, 
-    batch_size: Optional[int] = None, 
-    buffer_size: int = 1000, 
-    shuffle: bool = False, 
-    prefetch: bool = False
+    dataset: tf.data.Dataset,
+    batch_size: Optional[int] = None,
+    buffer_size: int = 1000,
+    shuffle: bool = False,
+    prefetch: bool = False,
+    cache: bool = False
 ) -> tf.data.Dataset:
 
-    first_element = next(iter(dataset))
-    is_batched = isinstance(first_element, tuple) and isinstance(first_element[0], tf.Tensor)
-    
-    if batch_size and not is_batched: dataset = dataset.batch(batch_size)
-    if shuffle: dataset = dataset.shuffle(buffer_size)
+    if cache: dataset = dataset.cache()
+    if shuffle: dataset = dataset.shuffle(buffer_size, reshuffle_each_iteration=True)
+    if batch_size and not is_batched(dataset): dataset = dataset.batch(batch_size)
     if prefetch: dataset = dataset.prefetch(tf.data.AUTOTUNE)
 
-    return dataset
\ No newline at end of file
+    return dataset
+
+def distribute_dataset(
+    dataset: tf.data.Dataset,
+    batch_size: int,
+    strategy: tf.distribute.Strategy
+) -> tf.data.Dataset:
+
+    global_batch_size = batch_size * strategy.num_replicas_in_sync
+    dataset = dataset.rebatch(global_batch_size) if is_batched(dataset) else dataset.batch(global_batch_size)
+
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.DATA
+    return dataset.with_options(options)
+
+def build_input_pipeline(
+    dataset: tf.data.Dataset,
+    img_size: Tuple[int, int],
+    model_type: str = '',
+    augment: bool = False,
+    batch_size: Optional[int] = None,
+    buffer_size: int = 1000,
+    shuffle: bool = False,
+    cache: bool = False,
+    deterministic: bool = False
+) -> tf.data.Dataset:
+
+    data_augmentation = create_augmentation() if augment else None
+
+    def transform_fn(x, y):
+        if data_augmentation is not None: x = data_augmentation(x, training=True)
+        x = tf.image.resize(x, img_size)
+        return normalize_fn(x, model_type), y
+
+    if cache: dataset = dataset.cache()
+    if shuffle: dataset = dataset.shuffle(buffer_size, reshuffle_each_iteration=True)
+    if batch_size and not is_batched(dataset): dataset = dataset.batch(batch_size)
+    dataset = dataset.map(transform_fn, num_parallel_calls=tf.data.AUTOTUNE, deterministic=deterministic)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+def measure_throughput(dataset: tf.data.Dataset, num_steps: int = 100, warmup_steps: int = 5) -> float:
+
+    iterator = iter(dataset)
+    for _ in range(warmup_steps): next(iterator, None)
+
+    steps = 0
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        if next(iterator, None) is None: break
+        steps += 1
+    elapsed = time.perf_counter() - start
+
+    steps_per_sec = steps / elapsed if elapsed > 0 else 0.0
+    print(f"Input pipeline: {steps} steps in {elapsed:.2f}s ({steps_per_sec:.2f} steps/sec)")
+    return steps_per_sec
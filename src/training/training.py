@@ -1,20 +1,40 @@
 from keras.applications import ResNet50, VGG16, MobileNetV2
 from keras.callbacks import EarlyStopping, ReduceLROnPlateau
 import matplotlib.pyplot as plt
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 import keras
 from tensorflow.data import Dataset
+import contextlib
 import os
+from src.utils import instrumentation
 
 def train_model(
     model: keras.Model, 
     train_dataset: Dataset, 
     val_dataset: Dataset, 
     batch_size: int = 32, 
-    epochs: int = 10
+    epochs: int = 10,
+    extra_callbacks: Optional[List[keras.callbacks.Callback]] = None,
+    jit_compile: Optional[bool] = None,
+    steps_per_execution: Optional[int] = None,
+    strategy=None,
+    checkpointer=None
 ) -> Tuple[dict, keras.Model]:
+
+    if strategy is not None:
+        from src.training.optimize_dataset import distribute_dataset
+        train_dataset = distribute_dataset(train_dataset, batch_size, strategy)
+        val_dataset = distribute_dataset(val_dataset, batch_size, strategy)
+
+    if jit_compile is not None or steps_per_execution is not None:
+        with strategy.scope() if strategy else contextlib.nullcontext():
+            model.compile(optimizer=model.optimizer,
+                          loss=model.loss,
+                          metrics=['accuracy'],
+                          jit_compile=bool(jit_compile),
+                          steps_per_execution=steps_per_execution or 1)
     
-    callbacks = []
+    callbacks = list(extra_callbacks or [])
 
     early_stopping = EarlyStopping(monitor='val_loss', patience=4, restore_best_weights=True)
     callbacks.append(early_stopping)
@@ -22,14 +42,48 @@ def train_model(
     reduce_lr = ReduceLROnPlateau(monitor='val_loss', factor=0.1, patience=2, verbose=1, mode='min')
     callbacks.append(reduce_lr)
 
-    history = model.fit(
-        train_dataset,
-        epochs=epochs,
-        validation_data=val_dataset,
-        callbacks=callbacks,
-        batch_size=batch_size
-    )
+    if instrumentation.is_enabled():
+        input_batch_ms = instrumentation.probe_input_pipeline(train_dataset)
+        print(f"Input pipeline: {input_batch_ms:.1f} ms/batch without the model")
+        callbacks.append(instrumentation.training_callback())
+
+    initial_epoch = 0
+    if checkpointer is not None:
+        initial_epoch = checkpointer.restore(model, early_stopping=early_stopping, reduce_lr=reduce_lr)
+        callbacks.append(checkpointer)
+
+    stopped = False
+    if checkpointer is not None and checkpointer.resume_step and initial_epoch < epochs:
+        history = model.fit(
+            train_dataset.skip(checkpointer.resume_step),
+            epochs=initial_epoch + 1,
+            initial_epoch=initial_epoch,
+            validation_data=val_dataset,
+            callbacks=callbacks,
+            batch_size=batch_size
+        )
+        stopped = model.stop_training
+        initial_epoch += 1
+
+    if not stopped:
+        history = model.fit(
+            train_dataset,
+            epochs=epochs,
+            initial_epoch=initial_epoch,
+            validation_data=val_dataset,
+            callbacks=callbacks,
+            batch_size=batch_size
+        )
+
+    if instrumentation.is_enabled():
+        stats = instrumentation.snapshot()
+        if 'train.step' in stats and 'train.input_batch' in stats:
+            ratio = stats['train.input_batch']['mean_ms'] / stats['train.step']['mean_ms']
+            print(f"Train step {stats['train.step']['mean_ms']:.1f} ms, input {stats['train.input_batch']['mean_ms']:.1f} ms "
+                  f"({'input-bound' if ratio > 0.8 else 'compute-bound'}, ratio {ratio:.2f})")
 
+    if checkpointer is not None:
+        return checkpointer.history, model
     return history.history, model
 
 def plot_training_history(history: dict, model_name: str = 'Model', save_path: Optional[str] = None) -> None:
@@ -0,0 +1,161 @@
+import argparse
+import json
+import time
+import weakref
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+import tensorflow as tf
+
+from src.data_preprocessing.basic_preprocessing import normalize_fn
+from src.serving.prediction_cache import PredictionCache
+from src.utils.model_utils import resize_images, run_forward
+from src.utils.quantization import TFLiteModel
+
+LAST_CONV_LAYERS = {
+    'vgg16': 'block5_conv3',
+    'resnet50v2': 'conv5_block3_out',
+    'mobilenetv2': 'out_relu',
+}
+
+_explain_fns = weakref.WeakKeyDictionary()
+
+
+def find_last_conv_layer(model, model_type: str):
+    names = {layer.name for layer in model.layers}
+    if LAST_CONV_LAYERS.get(model_type) in names:
+        return model.get_layer(LAST_CONV_LAYERS[model_type])
+    for layer in reversed(model.layers):
+        if len(getattr(layer.output, 'shape', ())) == 4:
+            return layer
+    raise ValueError(f"No convolutional feature map found in {model.name}")
+
+
+def get_explain_fn(model, model_type: str, img_size: Tuple[int, int] = (224, 224), channels: int = 3):
+    if isinstance(model, TFLiteModel):
+        raise ValueError("Grad-CAM needs the Keras model, TFLite variants have no gradients")
+
+    model_fns = _explain_fns.setdefault(model, {})
+    key = (model_type, tuple(img_size), channels)
+    if key not in model_fns:
+        import keras
+        grad_model = keras.Model(inputs=model.inputs,
+                                 outputs=[find_last_conv_layer(model, model_type).output, model.output])
+
+        @tf.function(input_signature=[tf.TensorSpec([None, *img_size, channels], tf.float32)])
+        def explain(x):
+            with tf.GradientTape() as tape:
+                conv, probs = grad_model(x, training=False)
+                conv = tf.cast(conv, tf.float32)
+                probs = tf.cast(probs, tf.float32)
+                score = tf.reduce_sum(tf.reduce_max(probs, axis=-1))
+            grads = tape.gradient(score, conv)
+            weights = tf.reduce_mean(grads, axis=(1, 2), keepdims=True)
+            cam = tf.nn.relu(tf.reduce_sum(weights * conv, axis=-1))
+            cam = cam / (tf.reduce_max(cam, axis=(1, 2), keepdims=True) + 1e-8)
+            return probs, cam
+
+        model_fns[key] = explain
+
+    return model_fns[key]
+
+
+def explain_batch(model,
+                  images: Union[Sequence, np.ndarray, tf.Tensor],
+                  class_names: List[str],
+                  model_type: str = 'vgg16',
+                  img_size: Tuple[int, int] = (224, 224),
+                  batch_size: int = 32) -> List[dict]:
+
+    images = normalize_fn(resize_images(images, img_size), model_type)
+    explain = get_explain_fn(model, model_type, img_size, images.shape[-1])
+
+    probs, heatmaps = [], []
+    for start in range(0, images.shape[0], batch_size):
+        batch_probs, batch_heatmaps = explain(images[start:start + batch_size])
+        probs.append(batch_probs.numpy())
+        heatmaps.append(batch_heatmaps.numpy())
+
+    return [{
+        'probabilities': {class_names[i]: float(p[i]) for i in range(len(class_names))},
+        'heatmap': heatmap,
+    } for p, heatmap in zip(np.concatenate(probs), np.concatenate(heatmaps))]
+
+
+def explain_cached(cache: PredictionCache, model, model_path, image, class_names, model_type='vgg16', img_size=(224, 224)) -> dict:
+
+    key = cache.make_key(image, model_path, preprocess_config={
+        'model_type': model_type,
+        'img_size': list(img_size),
+        'class_names': list(class_names),
+        'explain': 'gradcam',
+    })
+    return cache.get_or_compute(key, lambda: explain_batch(model, [image], class_names, model_type, img_size)[0])
+
+
+def overlay_heatmap(image, heatmap: np.ndarray, alpha: float = 0.4, colormap: str = 'jet'):
+    from matplotlib import colormaps
+    from PIL import Image
+
+    image = image.convert('RGB')
+    heatmap_image = Image.fromarray(np.uint8(255 * heatmap)).resize(image.size, Image.BILINEAR)
+    colored = colormaps[colormap](np.asarray(heatmap_image) / 255.0)[..., :3]
+    blended = (1 - alpha) * np.asarray(image, dtype=np.float32) + alpha * 255 * colored
+    return Image.fromarray(np.uint8(np.clip(blended, 0, 255)))
+
+
+def explain_overhead(model, model_type: str, images: np.ndarray, batch_sizes: Sequence[int] = (1, 8), num_runs: int = 20) -> List[Dict]:
+    images = normalize_fn(resize_images(images), model_type)
+    explain = get_explain_fn(model, model_type)
+
+    results = []
+    for batch_size in batch_sizes:
+        x = tf.gather(images, np.arange(batch_size) % images.shape[0])
+        timings = {}
+        for name, fn in (('predict', lambda: run_forward(model, x, batch_size=batch_size)),
+                         ('explain', lambda: [t.numpy() for t in explain(x)])):
+            for _ in range(3): fn()
+            latencies = []
+            for _ in range(num_runs):
+                start = time.perf_counter()
+                fn()
+                latencies.append(time.perf_counter() - start)
+            timings[name] = 1000 * float(np.median(latencies))
+
+        results.append({
+            'model_type': model_type,
+            'batch_size': batch_size,
+            'predict_ms': timings['predict'],
+            'explain_ms': timings['explain'],
+            'overhead': timings['explain'] / timings['predict'] - 1,
+        })
+        print(f"{model_type} batch {batch_size}: predict {timings['predict']:.1f} ms, "
+              f"predict + Grad-CAM {timings['explain']:.1f} ms ({100 * results[-1]['overhead']:+.0f}%)")
+    return results
+
+
+def main():
+    from src.benchmark.benchmark import load_sample_images
+    from src.serving.config import model_path
+    from src.utils.quantization import load_variant
+
+    parser = argparse.ArgumentParser(description="Report Grad-CAM latency overhead against plain prediction")
+    parser.add_argument('--model-types', nargs='+', default=list(LAST_CONV_LAYERS), choices=list(LAST_CONV_LAYERS))
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--num-runs', type=int, default=20)
+    parser.add_argument('--output', default='explain_overhead.json')
+    args = parser.parse_args()
+
+    images = load_sample_images()
+    results = []
+    for model_type in args.model_types:
+        model = load_variant(model_path(model_type))
+        results.extend(explain_overhead(model, model_type, images, args.batch_sizes, args.num_runs))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+import bisect
+import contextlib
+import functools
+import json
+import os
+import signal
+import threading
+import time
+from typing import Callable, Dict, Sequence
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_enabled = os.environ.get('INSTRUMENTATION', '0') == '1'
+_registry_lock = threading.Lock()
+_histograms: Dict[str, 'Histogram'] = {}
+_null_span = contextlib.nullcontext()
+
+
+class Histogram:
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        target = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target and count:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return 0.0
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'count': self.count,
+                'sum_s': self.sum,
+                'mean_ms': 1000 * self.sum / self.count if self.count else 0.0,
+                'p50_ms': 1000 * self.quantile(0.5),
+                'p95_ms': 1000 * self.quantile(0.95),
+                'max_ms': 1000 * self.max,
+                'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], self.counts)),
+            }
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def observe(name: str, seconds: float):
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _registry_lock:
+            histogram = _histograms.setdefault(name, Histogram())
+    histogram.observe(seconds)
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def span(name: str):
+    return _Span(name) if _enabled else _null_span
+
+
+def timed(name: str) -> Callable:
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_map_fn(name: str, fn: Callable) -> Callable:
+    if not _enabled:
+        return fn
+    import tensorflow as tf
+
+    def record(elapsed):
+        observe(name, float(elapsed))
+        return elapsed
+
+    def wrapped(*args):
+        start = tf.timestamp()
+        outputs = fn(*args)
+        with tf.control_dependencies(tf.nest.flatten(outputs)):
+            elapsed = tf.timestamp() - start
+        recorded = tf.py_function(record, [elapsed], tf.float64)
+        with tf.control_dependencies([recorded]):
+            return tf.nest.map_structure(tf.identity, outputs)
+
+    return wrapped
+
+
+def reset():
+    with _registry_lock:
+        _histograms.clear()
+
+
+def snapshot() -> Dict[str, dict]:
+    with _registry_lock:
+        histograms = dict(_histograms)
+    return {name: histogram.to_dict() for name, histogram in sorted(histograms.items())}
+
+
+def to_prometheus(metric: str = 'stage_duration_seconds') -> str:
+    lines = [f'# HELP {metric} Wall time spent in instrumented stages.', f'# TYPE {metric} histogram']
+    for name, stats in snapshot().items():
+        cumulative = 0
+        for bound, count in stats['buckets'].items():
+            cumulative += count
+            lines.append(f'{metric}_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{stage="{name}"}} {stats["sum_s"]}')
+        lines.append(f'{metric}_count{{stage="{name}"}} {stats["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def export(path: str):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        if path.endswith('.json'):
+            json.dump(snapshot(), f, indent=2)
+        else:
+            f.write(to_prometheus())
+    print(f"Instrumentation metrics saved to {path}")
+
+
+_trace_lock = threading.RLock()
+_trace = {'logdir': None, 'remaining': 0, 'active': False}
+
+
+def request_trace(logdir: str, num_steps: int = 10) -> bool:
+    with _trace_lock:
+        if _trace['remaining']:
+            print(f"A TensorFlow profiler trace into {_trace['logdir']} is already pending, ignoring request")
+            return False
+        _trace.update(logdir=logdir, remaining=num_steps, active=False)
+    print(f"TensorFlow profiler trace of the next {num_steps} steps requested in {logdir}")
+    return True
+
+
+def trace_step():
+    if not _trace['remaining']:
+        return
+    import tensorflow as tf
+    with _trace_lock:
+        if not _trace['active']:
+            tf.profiler.experimental.start(_trace['logdir'])
+            _trace['active'] = True
+            return
+        _trace['remaining'] -= 1
+        if _trace['remaining'] <= 0:
+            tf.profiler.experimental.stop()
+            _trace.update(remaining=0, active=False)
+            print(f"TensorFlow profiler trace saved to {_trace['logdir']}")
+
+
+def install_trace_signal(logdir: str, num_steps: int = 10, signum: int = signal.SIGUSR1):
+    signal.signal(signum, lambda *_: request_trace(logdir, num_steps))
+
+
+def training_callback():
+    import keras
+
+    class InstrumentationCallback(keras.callbacks.Callback):
+
+        def on_train_batch_begin(self, batch, logs=None):
+            trace_step()
+            self.step_start = time.perf_counter()
+
+        def on_train_batch_end(self, batch, logs=None):
+            observe('train.step', time.perf_counter() - self.step_start)
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self.epoch_start = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            observe('train.epoch', time.perf_counter() - self.epoch_start)
+
+        def on_test_begin(self, logs=None):
+            self.test_start = time.perf_counter()
+
+        def on_test_end(self, logs=None):
+            observe('train.validation', time.perf_counter() - self.test_start)
+
+    return InstrumentationCallback()
+
+
+def probe_input_pipeline(dataset, num_steps: int = 20) -> float:
+    iterator = iter(dataset)
+    for _ in range(num_steps):
+        with _Span('train.input_batch'):
+            if next(iterator, None) is None: break
+    stats = snapshot()
+    return stats['train.input_batch']['mean_ms'] if 'train.input_batch' in stats else 0.0
@@ -1,47 +1,123 @@
-import tensorflow_model_optimization as tfmot
 import tensorflow as tf
 from keras.models import load_model
 import numpy as np
-from src.data_preprocessing.basic_preprocessing import preprocess_data
+import weakref
+from typing import Dict, List, Sequence, Tuple, Union
+from src.data_preprocessing.basic_preprocessing import preprocess_data, normalize_fn
+from src.utils.quantization import TFLiteModel
+from src.utils.pruning import prune_and_fine_tune, prune_weights_one_shot, export_compressed
+from src.serving.prediction_cache import PredictionCache
+from src.utils.instrumentation import span, trace_step
 from tensorflow.keras.models import load_model
 from tensorflow.keras import layers, models
 
-def prune_model(model_path, pruning_percentage=0.5, save_path=None):
-    model = load_model(model_path)
-    prune_low_magnitude = tfmot.sparsity.keras.prune_low_magnitude
-    pruning_schedule = tfmot.sparsity.keras.ConstantSparsity(pruning_percentage, 0)
-
-    head_classifier_layers = [layer for layer in model.layers if isinstance(layer, (layers.Dense, layers.Dropout))]
-    new_model_layers = []
-    for layer in model.layers:
-        if layer in head_classifier_layers:
-            print(f"Pruning layer: {layer.name}")
-            new_model_layers.append(prune_low_magnitude(layer, pruning_schedule=pruning_schedule))
-        else:
-            new_model_layers.append(layer)
-
-    pruned_model = tf.keras.models.Model(inputs=model.input, outputs=new_model_layers[-1].output)
+def prune_model(model_path, pruning_percentage=0.5, save_path=None,
+                train_dataset=None, val_dataset=None, epochs=2, batch_size=32, include_backbone=False):
+
+    if train_dataset is not None and val_dataset is not None:
+        _, pruned_model = prune_and_fine_tune(model_path, train_dataset, val_dataset,
+                                              target_sparsity=pruning_percentage,
+                                              epochs=epochs,
+                                              batch_size=batch_size,
+                                              include_backbone=include_backbone,
+                                              save_path=save_path)
+        return pruned_model
+
+    if include_backbone:
+        raise ValueError("Pruning the backbone without fine-tuning destroys accuracy, pass train_dataset and val_dataset")
+    print("No training data given, applying one-shot magnitude pruning to the head without fine-tuning")
+    pruned_model = prune_weights_one_shot(load_model(model_path), pruning_percentage, include_backbone=include_backbone)
     pruned_model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
 
     if save_path:
-        pruned_model.save(save_path)
-        print(f"Pruned model saved to {save_path}")
+        export_compressed(pruned_model, save_path)
 
     return pruned_model
 
 def predict(model, image, class_names, model_type='vgg16', img_size=(224,224)):
 
-    if not isinstance(image, tf.Tensor):
-        image = tf.convert_to_tensor(np.array(image), dtype=tf.float32)
+    trace_step()
+    with span('predict.to_tensor'):
+        if not isinstance(image, tf.Tensor):
+            image = tf.convert_to_tensor(np.array(image), dtype=tf.float32)
+
+    with span('predict.preprocess'):
+        dataset = tf.data.Dataset.from_tensors((image, 0))
+        preprocessed_dataset = preprocess_data(dataset, img_size=img_size, normalize=True, model_type=model_type)
+
+        img_preprocessed = None
+        for x, y in preprocessed_dataset:
+            img_preprocessed = x
+        img_batch = tf.expand_dims(img_preprocessed, axis=0)
+
+    with span('predict.forward'):
+        predictions = run_forward(model, img_batch)
+
+    with span('predict.postprocess'):
+        probs = {class_names[i]: float(predictions[0][i]) for i in range(len(class_names))}
+    return probs
+
+def predict_cached(cache: PredictionCache, model, model_path, image, class_names, model_type='vgg16', img_size=(224,224)):
+
+    key = cache.make_key(image, model_path, preprocess_config={
+        'model_type': model_type,
+        'img_size': list(img_size),
+        'class_names': list(class_names),
+    })
+    return cache.get_or_compute(key, lambda: predict(model, image, class_names, model_type=model_type, img_size=img_size))
+
+_forward_fns = weakref.WeakKeyDictionary()
+
+def get_forward_fn(model, img_size=(224, 224), channels=3, jit_compile=False):
+    model_fns = _forward_fns.setdefault(model, {})
+    key = (tuple(img_size), channels, jit_compile)
+
+    if key not in model_fns:
+        model_ref = weakref.ref(model)
+
+        @tf.function(input_signature=[tf.TensorSpec([None, *img_size, channels], tf.float32)], jit_compile=jit_compile)
+        def forward(x):
+            return tf.cast(model_ref()(x, training=False), tf.float32)
+        model_fns[key] = forward
+
+    return model_fns[key]
+
+def resize_images(images: Union[Sequence, np.ndarray, tf.Tensor], img_size: Tuple[int, int] = (224, 224)) -> tf.Tensor:
+
+    if isinstance(images, (np.ndarray, tf.Tensor)) and len(images.shape) == 4:
+        images = tf.cast(images, tf.float32)
+        return images if tuple(images.shape[1:3]) == tuple(img_size) else tf.image.resize(images, img_size)
+    if len(images) == 0:
+        return tf.zeros((0, *img_size, 3), dtype=tf.float32)
+    return tf.stack([tf.image.resize(tf.convert_to_tensor(np.asarray(image), dtype=tf.float32), img_size)
+                     for image in images])
+
+def run_forward(model, images: tf.Tensor, batch_size: int = 32, jit_compile: bool = False) -> np.ndarray:
+
+    if isinstance(model, TFLiteModel):
+        forward = lambda x: model.predict(np.asarray(x))
+    else:
+        compiled = get_forward_fn(model, img_size=tuple(images.shape[1:3]), channels=images.shape[-1], jit_compile=jit_compile)
+        forward = lambda x: compiled(x).numpy()
 
-    dataset = tf.data.Dataset.from_tensors((image, 0))
-    preprocessed_dataset = preprocess_data(dataset, img_size=img_size, normalize=True, model_type=model_type)
+    outputs = [forward(images[start:start + batch_size]) for start in range(0, images.shape[0], batch_size)]
+    if not outputs:
+        num_classes = model.output_details['shape'][-1] if isinstance(model, TFLiteModel) else model.output_shape[-1]
+        return np.zeros((0, int(num_classes)), dtype=np.float32)
+    return np.concatenate(outputs)
 
-    img_preprocessed = None
-    for x, y in preprocessed_dataset:
-        img_preprocessed = x
-    img_batch = tf.expand_dims(img_preprocessed, axis=0)
+def predict_batch(model,
+                  images: Union[Sequence, np.ndarray, tf.Tensor],
+                  class_names: List[str],
+                  model_type: str = 'vgg16',
+                  img_size: Tuple[int, int] = (224, 224),
+                  batch_size: int = 32,
+                  jit_compile: bool = False) -> List[Dict[str, float]]:
 
-    predictions = model.predict(img_batch)
-    probs = {class_names[i]: float(predictions[0][i]) for i in range(len(class_names))}
-    return probs
\ No newline at end of file
+    trace_step()
+    with span('predict_batch.preprocess'):
+        images = normalize_fn(resize_images(images, img_size), model_type)
+    with span('predict_batch.forward'):
+        predictions = run_forward(model, images, batch_size=batch_size, jit_compile=jit_compile)
+    with span('predict_batch.postprocess'):
+        return [{class_names[i]: float(pred[i]) for i in range(len(class_names))} for pred in predictions]
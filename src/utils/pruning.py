@@ -0,0 +1,164 @@
+import gzip
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+import keras
+import numpy as np
+from keras import layers, models
+from keras.models import load_model
+from tensorflow.data import Dataset
+
+from src.data_preprocessing.basic_preprocessing import preprocess_data
+from src.training.training import train_model
+from src.utils.quantization import measure_variant, variant_accuracy
+
+PRUNABLE_LAYERS = (layers.Dense, layers.Conv2D, layers.DepthwiseConv2D)
+
+def polynomial_schedule(target_sparsity: float, end_step: int, begin_step: int = 0,
+                        initial_sparsity: float = 0.0, frequency: int = 100, power: float = 3.0):
+    def schedule(step: int) -> Optional[float]:
+        if step < begin_step or (step - begin_step) % frequency:
+            return None
+        progress = min(1.0, (step - begin_step) / max(end_step - begin_step, 1))
+        return target_sparsity + (initial_sparsity - target_sparsity) * (1 - progress) ** power
+
+    return schedule
+
+def prunable_layers(model: models.Model, include_backbone: bool = False) -> List[layers.Layer]:
+    found = []
+    for layer in model.layers:
+        if hasattr(layer, 'layers'):
+            found.extend(prunable_layers(layer, include_backbone))
+        elif isinstance(layer, layers.Dense) or (include_backbone and isinstance(layer, PRUNABLE_LAYERS)):
+            if 'float' in str(layer.kernel.dtype): found.append(layer)
+    return found
+
+def magnitude_mask(kernel: np.ndarray, sparsity: float) -> np.ndarray:
+    threshold = np.quantile(np.abs(kernel), sparsity)
+    return (np.abs(kernel) >= threshold).astype(kernel.dtype)
+
+class MagnitudePruning(keras.callbacks.Callback):
+
+    def __init__(self, pruned_layers: List[layers.Layer], schedule):
+        super().__init__()
+        self.kernels = [layer.kernel for layer in pruned_layers]
+        self.masks = [None] * len(self.kernels)
+        self.schedule = schedule
+        self.step = 0
+        for layer in pruned_layers: print(f"Pruning layer: {layer.name}")
+
+    def update_masks(self, sparsity: float):
+        for index, kernel in enumerate(self.kernels):
+            self.masks[index] = keras.ops.convert_to_tensor(magnitude_mask(keras.ops.convert_to_numpy(kernel), sparsity))
+
+    def apply_masks(self):
+        for kernel, mask in zip(self.kernels, self.masks):
+            if mask is not None: kernel.assign(kernel * mask)
+
+    def on_train_batch_end(self, batch, logs=None):
+        sparsity = self.schedule(self.step)
+        if sparsity is not None: self.update_masks(sparsity)
+        self.apply_masks()
+        self.step += 1
+
+    def on_train_end(self, logs=None):
+        self.apply_masks()
+
+def prune_weights_one_shot(model: models.Model, sparsity: float, include_backbone: bool = False) -> models.Model:
+    for layer in prunable_layers(model, include_backbone):
+        weights = layer.get_weights()
+        weights[0] = weights[0] * magnitude_mask(weights[0], sparsity)
+        layer.set_weights(weights)
+    return model
+
+def model_sparsity(model: models.Model) -> float:
+    zeros, total = 0, 0
+    for weight in model.trainable_weights + model.non_trainable_weights:
+        if 'kernel' in weight.name:
+            values = weight.numpy()
+            zeros += int(np.sum(values == 0))
+            total += values.size
+    return zeros / total if total else 0.0
+
+def gzipped_size(path: str) -> int:
+    with tempfile.NamedTemporaryFile(suffix='.gz', delete=False) as tmp:
+        tmp_path = tmp.name
+    with open(path, 'rb') as f_in, gzip.open(tmp_path, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    size = os.path.getsize(tmp_path)
+    os.remove(tmp_path)
+    return size
+
+def export_compressed(model: models.Model, save_path: str) -> str:
+    model_dir = os.path.dirname(save_path)
+    if model_dir: os.makedirs(model_dir, exist_ok=True)
+    model.save(save_path)
+
+    compressed_path = save_path + '.gz'
+    with open(save_path, 'rb') as f_in, gzip.open(compressed_path, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    print(f"Pruned model saved to {save_path} ({os.path.getsize(compressed_path) / 1e6:.1f} MB gzipped)")
+    return compressed_path
+
+def prune_and_fine_tune(model_path: str,
+                        train_dataset: Dataset,
+                        val_dataset: Dataset,
+                        target_sparsity: float = 0.5,
+                        epochs: int = 2,
+                        batch_size: int = 32,
+                        include_backbone: bool = False,
+                        end_step: Optional[int] = None,
+                        save_path: Optional[str] = None) -> Tuple[dict, models.Model]:
+
+    model = load_model(model_path)
+    pruned_layers = prunable_layers(model, include_backbone)
+    frozen = [layer for layer in pruned_layers if not layer.trainable]
+    for layer in frozen: layer.trainable = True
+    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    if end_step is None:
+        steps_per_epoch = int(train_dataset.cardinality().numpy())
+        if steps_per_epoch < 0:
+            raise ValueError("train_dataset has unknown cardinality, pass end_step explicitly")
+        end_step = steps_per_epoch * epochs
+
+    schedule = polynomial_schedule(target_sparsity, end_step=max(int(end_step * 0.8), 1))
+    pruning = MagnitudePruning(pruned_layers, schedule)
+
+    history, pruned_model = train_model(model, train_dataset, val_dataset,
+                                        batch_size=batch_size, epochs=epochs,
+                                        extra_callbacks=[pruning])
+    for layer in frozen: layer.trainable = False
+    pruned_model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    print(f"Final kernel sparsity: {model_sparsity(pruned_model):.2%}")
+
+    if save_path: export_compressed(pruned_model, save_path)
+    return history, pruned_model
+
+def pruning_report(model_paths: Dict[str, Tuple[str, str]],
+                   test_dataset: Dataset,
+                   img_size: Tuple[int, int] = (224, 224),
+                   num_runs: int = 30,
+                   save_path: Optional[str] = None):
+    import pandas as pd
+
+    rows = []
+    for model_type, (original_path, pruned_path) in model_paths.items():
+        preprocessed = preprocess_data(test_dataset, img_size=img_size, model_type=model_type)
+        for variant, path in (('original', original_path), ('pruned', pruned_path)):
+            model = load_model(path)
+            rows.append({
+                'model_type': model_type,
+                'variant': variant,
+                'sparsity': model_sparsity(model),
+                'size_mb': os.path.getsize(path) / 1e6,
+                'gzip_size_mb': gzipped_size(path) / 1e6,
+                **measure_variant(path, (1, *img_size, 3), num_runs),
+                'accuracy': variant_accuracy(model, preprocessed),
+            })
+
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False))
+    if save_path: report.to_csv(save_path, index=False)
+    return report
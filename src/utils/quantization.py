@@ -0,0 +1,233 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from src.data_preprocessing.basic_preprocessing import preprocess_data
+
+TFLITE_VARIANTS = ('dynamic', 'int8', 'float16')
+
+
+class TFLiteModel:
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None):
+        self.model_path = model_path
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self.batch_size = int(self.input_details['shape'][0])
+        self._lock = threading.Lock()
+
+    def _quantize_input(self, x: np.ndarray) -> np.ndarray:
+        dtype = self.input_details['dtype']
+        if dtype == np.float32: return x.astype(np.float32)
+        scale, zero_point = self.input_details['quantization']
+        return np.clip(np.round(x / scale + zero_point), np.iinfo(dtype).min, np.iinfo(dtype).max).astype(dtype)
+
+    def _dequantize_output(self, y: np.ndarray) -> np.ndarray:
+        if self.output_details['dtype'] == np.float32: return y
+        scale, zero_point = self.output_details['quantization']
+        return (y.astype(np.float32) - zero_point) * scale
+
+    def predict(self, x, verbose=0) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32)
+        with self._lock:
+            return self._predict(x)
+
+    def _predict(self, x: np.ndarray) -> np.ndarray:
+        if x.shape[0] != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input_details['index'], x.shape)
+            self.interpreter.allocate_tensors()
+            self.input_details = self.interpreter.get_input_details()[0]
+            self.output_details = self.interpreter.get_output_details()[0]
+            self.batch_size = x.shape[0]
+
+        self.interpreter.set_tensor(self.input_details['index'], self._quantize_input(x))
+        self.interpreter.invoke()
+        return self._dequantize_output(self.interpreter.get_tensor(self.output_details['index']))
+
+    def __call__(self, x, training=False) -> np.ndarray:
+        return self.predict(x)
+
+
+def representative_dataset(dataset: tf.data.Dataset,
+                           model_type: str,
+                           img_size: Tuple[int, int] = (224, 224),
+                           num_samples: int = 100):
+    samples = preprocess_data(dataset, img_size=img_size, model_type=model_type).unbatch().take(num_samples)
+
+    def generator():
+        for x, _ in samples:
+            yield [tf.expand_dims(x, axis=0)]
+
+    return generator
+
+
+def convert_to_tflite(model, variant: str = 'dynamic', representative_data=None) -> bytes:
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if variant == 'dynamic':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif variant == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == 'int8':
+        if representative_data is None:
+            raise ValueError("Full int8 quantization needs representative_data for calibration")
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_data
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    elif variant != 'float':
+        raise ValueError(f"Unknown quantization variant: {variant}")
+
+    return converter.convert()
+
+
+def tflite_path(model_dir: str, variant: str) -> str:
+    return os.path.join(model_dir, f"model_{variant}.tflite")
+
+
+def keras_int8_path(model_dir: str) -> str:
+    return os.path.join(model_dir, "model_keras_int8.keras")
+
+
+def quantize_model(model_path: str,
+                   calibration_dataset: tf.data.Dataset,
+                   model_type: str,
+                   output_dir: Optional[str] = None,
+                   variants: Sequence[str] = TFLITE_VARIANTS,
+                   img_size: Tuple[int, int] = (224, 224),
+                   num_calibration_samples: int = 100,
+                   keras_int8: bool = True) -> Dict[str, str]:
+    import keras
+
+    output_dir = output_dir or os.path.dirname(model_path)
+    os.makedirs(output_dir, exist_ok=True)
+    model = keras.models.load_model(model_path)
+    outputs = {}
+
+    if keras_int8:
+        quantized = keras.models.load_model(model_path)
+        quantized.quantize('int8')
+        outputs['keras_int8'] = keras_int8_path(output_dir)
+        quantized.save(outputs['keras_int8'])
+        print(f"Keras int8 model saved to {outputs['keras_int8']}")
+
+    representative_data = representative_dataset(calibration_dataset, model_type, img_size, num_calibration_samples)
+    for variant in variants:
+        flatbuffer = convert_to_tflite(model, variant, representative_data if variant == 'int8' else None)
+        outputs[variant] = tflite_path(output_dir, variant)
+        with open(outputs[variant], 'wb') as f:
+            f.write(flatbuffer)
+        print(f"{variant} TFLite model saved to {outputs[variant]}")
+
+    return outputs
+
+
+def load_variant(model_path: str, num_threads: Optional[int] = None):
+    if model_path.endswith('.tflite'):
+        return TFLiteModel(model_path, num_threads=num_threads)
+    from src.utils.shared_weights import is_artifact, load_artifact
+    if is_artifact(model_path):
+        return load_artifact(model_path)
+    import keras
+    return keras.models.load_model(model_path)
+
+
+def _measure_variant(model_path: str, input_shape: Tuple[int, ...], num_runs: int, result_queue):
+    import resource
+
+    model = load_variant(model_path)
+    x = np.random.uniform(-1.0, 1.0, size=input_shape).astype(np.float32)
+    model.predict(x, verbose=0)
+
+    latencies = []
+    for _ in range(num_runs):
+        start = time.perf_counter()
+        model.predict(x, verbose=0)
+        latencies.append(time.perf_counter() - start)
+
+    result_queue.put({
+        'latency_ms': 1000 * float(np.median(latencies)),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+
+
+def measure_variant(model_path: str,
+                    input_shape: Tuple[int, ...] = (1, 224, 224, 3),
+                    num_runs: int = 50,
+                    timeout_s: float = 600.0) -> dict:
+    import queue
+
+    context = multiprocessing.get_context('spawn')
+    result_queue = context.Queue()
+    process = context.Process(target=_measure_variant, args=(model_path, input_shape, num_runs, result_queue))
+    process.start()
+    try:
+        result = result_queue.get(timeout=timeout_s)
+    except queue.Empty:
+        result = None
+    finally:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+
+    if result is None:
+        raise RuntimeError(f"Measuring {model_path} failed: worker exited with code {process.exitcode} "
+                           f"without a result within {timeout_s:.0f}s")
+    return result
+
+
+def variant_accuracy(model, dataset: Iterable) -> float:
+    correct, total = 0, 0
+    for x, y in dataset:
+        preds = model.predict(x.numpy(), verbose=0)
+        correct += int(np.sum(np.argmax(preds, axis=-1) == np.argmax(y.numpy(), axis=-1)))
+        total += len(preds)
+    return correct / total if total else 0.0
+
+
+def quantization_report(model_path: str,
+                        variant_paths: Dict[str, str],
+                        test_dataset: tf.data.Dataset,
+                        model_type: str,
+                        img_size: Tuple[int, int] = (224, 224),
+                        num_runs: int = 50,
+                        save_path: Optional[str] = None):
+    import pandas as pd
+
+    preprocessed = preprocess_data(test_dataset, img_size=img_size, model_type=model_type)
+    paths = {'float': model_path, **variant_paths}
+
+    rows = []
+    baseline_accuracy = None
+    for variant, path in paths.items():
+        accuracy = variant_accuracy(load_variant(path), preprocessed)
+        if baseline_accuracy is None: baseline_accuracy = accuracy
+        rows.append({
+            'variant': variant,
+            'path': path,
+            'size_mb': os.path.getsize(path) / (1024 * 1024),
+            **measure_variant(path, (1, *img_size, 3), num_runs),
+            'accuracy': accuracy,
+            'accuracy_delta': accuracy - baseline_accuracy,
+        })
+
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False))
+
+    if save_path:
+        with open(save_path, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"Quantization report saved to {save_path}")
+
+    return report
@@ -0,0 +1,289 @@
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+ARTIFACT_FORMAT_VERSION = 1
+ARTIFACT_SUFFIX = '.shared'
+DEFAULT_BLOB_DIR = './saved/blobs'
+
+_shared_layers = weakref.WeakValueDictionary()
+_shared_lock = threading.Lock()
+
+
+def artifact_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + ARTIFACT_SUFFIX
+
+
+def is_artifact(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, 'manifest.json'))
+
+
+def blob_path(blob_dir: str, key: str) -> str:
+    return os.path.join(blob_dir, key[:2], f"{key}.npy")
+
+
+def write_blob(array: np.ndarray, blob_dir: str = DEFAULT_BLOB_DIR) -> str:
+    array = np.ascontiguousarray(array)
+    digest = hashlib.blake2b(f"{array.dtype.str}|{array.shape}|".encode('utf-8'), digest_size=20)
+    digest.update(array.tobytes())
+    key = digest.hexdigest()
+
+    path = blob_path(blob_dir, key)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+    return key
+
+
+def load_blob(blob_dir: str, entry: dict) -> np.ndarray:
+    return np.load(blob_path(blob_dir, entry['hash']), mmap_mode='r' if int(np.prod(entry['shape'])) else None)
+
+
+def read_manifest(path: str) -> dict:
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact version in {path}: {manifest.get('version')}")
+    return manifest
+
+
+def export_artifact(model, output_dir: Optional[str] = None, blob_dir: str = DEFAULT_BLOB_DIR) -> dict:
+    import keras
+    from src.serving.prediction_cache import model_version
+
+    source = model if isinstance(model, str) else None
+    if source:
+        model = keras.models.load_model(source)
+    if output_dir is None:
+        if source is None: raise ValueError("output_dir is required when exporting an in-memory model")
+        output_dir = artifact_path(source)
+
+    existing = {os.path.basename(path) for path in glob.glob(os.path.join(blob_dir, '*', '*.npy'))}
+    layers, total_bytes, new_bytes = {}, 0, 0
+    for layer in model.layers:
+        entries = []
+        for weight, array in zip(layer.weights, layer.get_weights()):
+            key = write_blob(array, blob_dir)
+            total_bytes += array.nbytes
+            if f"{key}.npy" not in existing:
+                existing.add(f"{key}.npy")
+                new_bytes += array.nbytes
+            entries.append({'hash': key, 'shape': list(array.shape), 'dtype': array.dtype.str,
+                            'trainable': bool(weight.trainable)})
+        if entries: layers[layer.name] = entries
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {
+        'version': ARTIFACT_FORMAT_VERSION,
+        'source': source,
+        'source_version': model_version(source) if source else None,
+        'blob_dir': os.path.relpath(blob_dir, output_dir),
+        'config': json.loads(model.to_json()),
+        'layers': layers,
+    }
+    tmp_path = os.path.join(output_dir, f"manifest.json.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(output_dir, 'manifest.json'))
+
+    print(f"Exported {source or model.name} to {output_dir}: "
+          f"{total_bytes / (1024 * 1024):.1f} MB of weights, {new_bytes / (1024 * 1024):.1f} MB new blobs")
+    return {'artifact': output_dir, 'weights_mb': total_bytes / (1024 * 1024), 'new_mb': new_bytes / (1024 * 1024)}
+
+
+def _layer_key(layer, entries: List[dict]) -> Optional[str]:
+    if not entries or any(entry['trainable'] for entry in entries):
+        return None
+    config = json.dumps(layer.get_config(), sort_keys=True, default=str)
+    hashes = '|'.join(entry['hash'] for entry in entries)
+    return hashlib.blake2b(f"{type(layer).__name__}|{config}|{hashes}".encode('utf-8'), digest_size=20).hexdigest()
+
+
+def load_artifact(path: str, share_layers: bool = True):
+    import keras
+
+    manifest = read_manifest(path)
+    blob_dir = os.path.normpath(os.path.join(path, manifest['blob_dir']))
+    layers = manifest['layers']
+    model = keras.models.model_from_json(json.dumps(manifest['config']))
+
+    keys = {layer.name: _layer_key(layer, layers.get(layer.name)) for layer in model.layers} if share_layers else {}
+    with _shared_lock:
+        shared = {name: _shared_layers.get(key) for name, key in keys.items() if key}
+    shared = {name: layer for name, layer in shared.items() if layer is not None}
+
+    if shared:
+        def clone_function(layer):
+            if layer.name in shared:
+                return shared[layer.name]
+            return layer.__class__.from_config(layer.get_config())
+
+        model = keras.models.clone_model(model, clone_function=clone_function)
+
+    for layer in model.layers:
+        if layer.name in shared or layer.name not in layers:
+            continue
+        layer.set_weights([load_blob(blob_dir, entry) for entry in layers[layer.name]])
+        if keys.get(layer.name):
+            with _shared_lock:
+                _shared_layers.setdefault(keys[layer.name], layer)
+
+    return model
+
+
+def collect_garbage(saved_dir: str = './saved', blob_dir: str = DEFAULT_BLOB_DIR) -> int:
+    referenced = set()
+    for manifest_path in glob.glob(os.path.join(saved_dir, '**', 'manifest.json'), recursive=True):
+        artifact = os.path.dirname(manifest_path)
+        manifest = read_manifest(artifact)
+        if os.path.normpath(os.path.join(artifact, manifest['blob_dir'])) != os.path.normpath(blob_dir):
+            continue
+        referenced.update(entry['hash'] for entries in manifest['layers'].values() for entry in entries)
+
+    removed = 0
+    for path in glob.glob(os.path.join(blob_dir, '*', '*.npy')):
+        if os.path.basename(path)[:-len('.npy')] not in referenced:
+            os.remove(path)
+            removed += 1
+    print(f"Removed {removed} unreferenced blobs from {blob_dir}")
+    return removed
+
+
+def saved_models(saved_dir: str = './saved') -> List[str]:
+    return sorted(glob.glob(os.path.join(saved_dir, '*', '*', '*.keras')))
+
+
+def export_all(saved_dir: str = './saved', blob_dir: str = DEFAULT_BLOB_DIR, force: bool = False) -> List[dict]:
+    from src.serving.prediction_cache import model_version
+
+    results = []
+    for source in saved_models(saved_dir):
+        output_dir = artifact_path(source)
+        if not force and is_artifact(output_dir) and read_manifest(output_dir).get('source_version') == model_version(source):
+            print(f"{output_dir} is up to date")
+            continue
+        results.append(export_artifact(source, output_dir, blob_dir))
+
+    blobs = glob.glob(os.path.join(blob_dir, '*', '*.npy'))
+    store_mb = sum(os.path.getsize(path) for path in blobs) / (1024 * 1024)
+    keras_mb = sum(os.path.getsize(path) for path in saved_models(saved_dir)) / (1024 * 1024)
+    print(f"{len(blobs)} blobs, {store_mb:.1f} MB in {blob_dir} for {keras_mb:.1f} MB of .keras files")
+    return results
+
+
+def proportional_set_size_mb() -> float:
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _load_all(paths: Sequence[str], barrier, result_queue, timeout_s: float):
+    import resource
+    from src.serving.model_pool import current_rss_mb
+    from src.utils.quantization import load_variant
+
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    models = [load_variant(path) for path in paths]
+    load_s = time.perf_counter() - start
+    barrier.wait(timeout_s)
+
+    result_queue.put({
+        'load_s': load_s,
+        'rss_delta_mb': current_rss_mb() - rss_before,
+        'pss_mb': proportional_set_size_mb(),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+    barrier.wait(timeout_s)
+    del models
+
+
+def load_report(saved_dir: str = './saved', num_processes: int = 1, timeout_s: float = 600.0) -> Dict[str, dict]:
+    import queue
+
+    sources = [source for source in saved_models(saved_dir) if is_artifact(artifact_path(source))]
+    formats = {'keras': sources, 'shared': [artifact_path(source) for source in sources]}
+    context = multiprocessing.get_context('spawn')
+
+    report = {}
+    for name, paths in formats.items():
+        barrier = context.Barrier(num_processes)
+        result_queue = context.Queue()
+        processes = [context.Process(target=_load_all, args=(paths, barrier, result_queue, timeout_s))
+                     for _ in range(num_processes)]
+        for process in processes: process.start()
+        results = []
+        deadline = time.monotonic() + timeout_s
+        try:
+            while len(results) < num_processes and time.monotonic() < deadline:
+                try:
+                    results.append(result_queue.get(timeout=1.0))
+                except queue.Empty:
+                    if any(process.exitcode for process in processes): break
+            if len(results) < num_processes: barrier.abort()
+        finally:
+            for process in processes:
+                process.join(timeout=timeout_s if len(results) == num_processes else 10)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+
+        exit_codes = [process.exitcode for process in processes]
+        if len(results) < num_processes or any(exit_codes):
+            raise RuntimeError(f"Loading the {name} models failed: {len(results)}/{num_processes} workers reported, "
+                               f"exit codes {exit_codes}")
+
+        report[name] = {
+            'models': len(paths),
+            'processes': num_processes,
+            'load_s': float(np.mean([result['load_s'] for result in results])),
+            'rss_delta_mb': float(np.mean([result['rss_delta_mb'] for result in results])),
+            'total_pss_mb': float(np.sum([result['pss_mb'] for result in results])),
+            'peak_rss_mb': float(np.max([result['peak_rss_mb'] for result in results])),
+        }
+        print(f"{name:>6}: {len(paths)} models in {report[name]['load_s']:.2f}s, "
+              f"+{report[name]['rss_delta_mb']:.0f} MB RSS per process, {report[name]['total_pss_mb']:.0f} MB PSS total")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export saved models to content-addressed shared-weight artifacts")
+    parser.add_argument('--saved-dir', default='./saved')
+    parser.add_argument('--blob-dir', default=DEFAULT_BLOB_DIR)
+    parser.add_argument('--force', action='store_true', help="Re-export artifacts that are already up to date")
+    parser.add_argument('--gc', action='store_true', help="Delete blobs no artifact references")
+    parser.add_argument('--report', action='store_true', help="Compare load time and memory against the .keras files")
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    export_all(args.saved_dir, args.blob_dir, force=args.force)
+    if args.gc:
+        collect_garbage(args.saved_dir, args.blob_dir)
+    if args.report:
+        report = load_report(args.saved_dir, args.processes)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
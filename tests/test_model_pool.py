@@ -0,0 +1,33 @@
+import gc
+import weakref
+
+import pytest
+
+keras = pytest.importorskip('keras')
+
+from src.serving.model_pool import ModelPool, model_size_mb
+
+
+def tiny_model():
+    inputs = keras.Input((224, 224, 3))
+    x = keras.layers.GlobalAveragePooling2D()(inputs)
+    outputs = keras.layers.Dense(4, activation='softmax')(x)
+    return keras.Model(inputs, outputs)
+
+
+def test_evicted_model_is_garbage_collected():
+    refs = {}
+
+    def loader(model_path):
+        model = tiny_model()
+        refs[model_path] = weakref.ref(model)
+        return model
+
+    pool = ModelPool(memory_budget_mb=1.5 * model_size_mb(tiny_model(), ''), loader=loader, warmup=True)
+    pool.get('first')
+    pool.get('second')
+    gc.collect()
+
+    assert not pool.metrics()['models']['first']['resident']
+    assert refs['first']() is None
+    assert refs['second']() is not None